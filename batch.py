@@ -0,0 +1,195 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module computes recommendations for many Steam users at once, without Pygame.
+
+Each line of the input file is a JSON object describing one user:
+
+    {"user_id": "76561197960287930", "answers": [true, null, false, ...],
+     "library": {"response": {"games": [{"appid": 10, "playtime_forever": 42}, ...]}}}
+
+answers has one entry per question of the Q & A page, in the order of GENRE_QUESTIONS: true for
+'Yes', false for 'No thanks' and null for 'Don't care' (a missing answers list means the user does
+not care about any question). library is the output of read_json_data for the user, and can be
+missing or null if the user has no Steam account. Each line of the output file is a JSON object
+with the top games recommended for the user of the same line, best first:
+
+    {"user_id": "76561197960287930", "games": ["1091500", ...], "scores": [12.7, ...]}
+
+The scores are computed by the RecommendationEngine, as on the results page of the interactive
+system. A line that cannot be scored (invalid JSON, answers of the wrong length, a library that
+is not in the format of read_json_data, such as the one of a private profile) does not stop the
+others: its output line is an error record instead,
+
+    {"user_id": "76561197960287930", "error": "KeyError: 'games'"}
+
+with a null user_id if it could not be read.
+
+Usage: python batch.py input_jsonl output_jsonl [--catalogue CSV] [--workers N] [--top N]
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import time
+from typing import Iterator
+from data_computations import load_games
+from recommendation_engine import RecommendationEngine, NUM_RESULTS
+from weighted_decision import NUM_QUESTIONS
+
+# Number of users read, scored and written at a time, so that the memory used does not grow
+# with the size of the input file
+BATCH_SIZE = 4096
+
+# Number of users sent to a worker process at a time
+CHUNK_SIZE = 64
+
+# The engine scoring the users in this process, set by _init_worker
+_WORKER_STATE = {}
+
+
+def recommend_user(engine: RecommendationEngine, user: dict, n: int = NUM_RESULTS) -> dict:
+    """Return the top <n> games recommended to the given user, in the output format of this
+    module.
+
+    Raise a ValueError if the answers of the user do not have one entry per question.
+
+    Preconditions:
+        - n >= 0
+    """
+    user_answers = user.get('answers') or [None] * NUM_QUESTIONS
+    if len(user_answers) != NUM_QUESTIONS:
+        raise ValueError(f'expected {NUM_QUESTIONS} answers, got {len(user_answers)}')
+    answers = [answer is True for answer in user_answers]
+    dont_care = [i for i in range(NUM_QUESTIONS) if user_answers[i] is None]
+
+    recommendations = engine.recommend(answers, dont_care, user.get('library'), n)
+    return {'user_id': user.get('user_id'), 'games': [game for game, _ in recommendations],
+            'scores': [score for _, score in recommendations]}
+
+
+def recommend_file(input_name: str, output_name: str,
+                   catalogue_name: str = 'data/final_games.csv', workers: int = 1,
+                   n: int = NUM_RESULTS) -> tuple[int, float]:
+    """Write the recommendations of every user of the JSONL file <input_name> to the JSONL file
+    <output_name>, in the same order, and return the number of users and the number of seconds
+    spent scoring them (after the catalogue is loaded).
+
+    The catalogue is loaded once with load_games. If workers > 1, the users are scored by a pool
+    of that many processes. Where processes can be forked, the workers share the catalogue
+    loaded by this process; otherwise, each worker loads it once when it starts. The users are
+    read and written BATCH_SIZE at a time, so the results are written while later users are
+    scored.
+
+    Preconditions:
+        - workers > 0
+        - n >= 0
+    """
+    _init_worker(catalogue_name)
+    with open(input_name) as input_file, open(output_name, 'w') as output_file:
+        start, num_users = time.perf_counter(), 0
+        if workers == 1:
+            for batch in _batches(input_file):
+                output_file.writelines(_recommend_line(line, n) for line in batch)
+                num_users += len(batch)
+        else:
+            with _executor(catalogue_name, workers) as executor:
+                for batch in _batches(input_file):
+                    output_file.writelines(executor.map(_recommend_line, batch,
+                                                        [n] * len(batch), chunksize=CHUNK_SIZE))
+                    num_users += len(batch)
+
+    return (num_users, time.perf_counter() - start)
+
+
+def _executor(catalogue_name: str, workers: int) -> ProcessPoolExecutor:
+    """Return a pool of <workers> processes that have the catalogue of this process."""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # forked workers inherit _WORKER_STATE, and share its memory until they write to it
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('fork'))
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(catalogue_name,))
+
+
+def _batches(input_file: Iterator[str]) -> Iterator[list[str]]:
+    """Yield the non-empty lines of the given file, BATCH_SIZE lines at a time."""
+    batch = []
+    for line in input_file:
+        if line.strip() != '':
+            batch.append(line)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch != []:
+        yield batch
+
+
+def _init_worker(catalogue_name: str) -> None:
+    """Load the catalogue for the users scored in this process."""
+    _WORKER_STATE['engine'] = RecommendationEngine(*load_games(catalogue_name))
+
+
+def _recommend_line(line: str, n: int) -> str:
+    """Return the output line of the user described by the given input line, using the catalogue
+    of this process, or an error record if the line cannot be scored.
+
+    >>> import os, tempfile
+    >>> from data_computations import read_csv
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     read_csv('data/sample_original_games.csv', os.path.join(directory, 'final.csv'))
+    ...     _init_worker(os.path.join(directory, 'final.csv'))
+    >>> print(_recommend_line('{"user_id": "1", "library": {"response": {}}}', 3), end='')
+    {"user_id": "1", "error": "KeyError: 'games'"}
+    >>> print(_recommend_line('{"user_id": "2", "answers": [true]}', 3), end='')
+    {"user_id": "2", "error": "ValueError: expected 9 answers, got 1"}
+    >>> print(_recommend_line('not json', 3), end='')
+    {"user_id": null, "error": "JSONDecodeError: Expecting value: line 1 column 1 (char 0)"}
+    """
+    engine, user = _WORKER_STATE['engine'], None
+    try:
+        user = json.loads(line)
+        result = recommend_user(engine, user, n)
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError) as error:
+        user_id = user.get('user_id') if isinstance(user, dict) else None
+        result = {'user_id': user_id, 'error': f'{type(error).__name__}: {error}'}
+    return json.dumps(result) + '\n'
+
+
+def parse_args(args: list[str] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments of the batch recommendations."""
+    parser = argparse.ArgumentParser(description='Recommend games to every user of a JSONL file '
+                                                 'of answers and Steam libraries.')
+    parser.add_argument('input_name')
+    parser.add_argument('output_name')
+    parser.add_argument('--catalogue', default='data/final_games.csv', metavar='CSV',
+                        help='the final games csv to recommend from')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='number of processes scoring the users')
+    parser.add_argument('--top', type=int, default=NUM_RESULTS, metavar='N',
+                        help='number of games recommended to each user')
+    return parser.parse_args(args)
+
+
+def run(args: list[str] = None) -> None:
+    """Compute the batch recommendations with the given command line arguments, and report the
+    throughput."""
+    options = parse_args(args)
+    num_users, seconds = recommend_file(options.input_name, options.output_name,
+                                        options.catalogue, options.workers, options.top)
+    print(f'{num_users} users in {seconds:.2f} s '
+          f'({num_users / max(seconds, 1e-9):.0f} users/s)')
+
+
+if __name__ == '__main__':
+    run()
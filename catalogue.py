@@ -0,0 +1,357 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module contains functions that write and read the binary version of the final games
+csv, which is memory-mapped so that the program can start without parsing the csv.
+
+The file starts with a header (HEADER_FORMAT) recording the size and modification time of the
+csv it was built from, followed by one entry per section (SECTION_FORMAT) and the sections
+themselves. Every section is a flat little-endian array:
+    - strings (ids, names, urls, descriptions, and the interned feature names of each attribute)
+      are stored as a uint64 offset array followed by a utf-8 blob
+    - prices, popularity scores and packed genre bits form a fixed-width numeric section
+    - the features of each game and the neighbours of each game are stored as CSR arrays
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+import mmap
+import os
+import struct
+import time
+from typing import Optional, Union
+import numpy as np
+from weighted_decision import Game, DecisionTree, WeightedGraph, CSRGraph, FeatureVocabulary, \
+    CachedTextStore, FEATURE_ATTRIBUTES, LAZY_TEXT_FIELDS
+
+MAGIC = b'STEAMCAT'
+VERSION = 1
+# magic, version, number of sections, number of games, source csv size, source csv mtime (ns)
+HEADER_FORMAT = '<8sIIQQQ'
+# section name, dtype, offset, number of items
+SECTION_FORMAT = '<32s8sQQ'
+
+NUMERIC_DTYPE = np.dtype([('price', '<f8'), ('popularity_score', '<f8'), ('genre_bits', '<u2')])
+# Text fields read when the catalogue is loaded; LAZY_TEXT_FIELDS are read from the file on access
+RESIDENT_TEXT_FIELDS = ('id_num', 'name')
+TEXT_FIELDS = RESIDENT_TEXT_FIELDS + LAZY_TEXT_FIELDS
+
+
+def binary_name(filename: str) -> str:
+    """Return the name of the binary catalogue built from the csv <filename>.
+
+    >>> binary_name('data/final_games.csv')
+    'data/final_games.bin'
+    """
+    return os.path.splitext(filename)[0] + '.bin'
+
+
+def is_fresh(binary: str, source: str) -> bool:
+    """Return whether the binary catalogue exists and was built from the current version of the
+    csv <source>. If <source> does not exist, any valid binary catalogue is considered fresh.
+    """
+    header = _read_header(binary)
+    if header is None:
+        return False
+    elif not os.path.exists(source):
+        return True
+    else:
+        stat = os.stat(source)
+        return (header[4], header[5]) == (stat.st_size, stat.st_mtime_ns)
+
+
+def write_catalogue(binary: str, games: dict[str, Game],
+                    graph: Union[WeightedGraph, CSRGraph], source: str) -> None:
+    """Write the binary catalogue of the given games and graph, built from the csv <source>.
+
+    Preconditions:
+        - os.path.exists(source)
+    """
+    ids = list(games)
+    position = {ids[i]: i for i in range(len(ids))}
+    sections = {}
+
+    for field in TEXT_FIELDS:
+        sections[field + '_offsets'], sections[field] = \
+            _encode_strings([getattr(games[id_num], field) for id_num in ids])
+
+    numeric = np.zeros(len(ids), dtype=NUMERIC_DTYPE)
+    numeric['price'] = [games[id_num].price for id_num in ids]
+    numeric['popularity_score'] = [games[id_num].popularity_score for id_num in ids]
+    numeric['genre_bits'] = [games[id_num].genre_mask for id_num in ids]
+    sections['numeric'] = numeric
+
+    for attr in FEATURE_ATTRIBUTES:
+        vocabulary, indptr, indices = {}, [0], []
+        for id_num in ids:
+            for feature in getattr(games[id_num], attr):
+                indices.append(vocabulary.setdefault(feature, len(vocabulary)))
+            indptr.append(len(indices))
+        sections[attr + '_vocab_offsets'], sections[attr + '_vocab'] = \
+            _encode_strings(list(vocabulary))
+        sections[attr + '_indptr'] = np.array(indptr, dtype='<u4')
+        sections[attr + '_indices'] = np.array(indices, dtype='<u4')
+
+    indptr, indices, weights = [0], [], []
+    for id_num in ids:
+        # rows are sorted by vertex number, as CSRGraph requires
+        row = sorted((position[neighbour], weight)
+                     for neighbour, weight in graph.get_neighbours(id_num).items())
+        indices.extend(j for j, _ in row)
+        weights.extend(weight for _, weight in row)
+        indptr.append(len(indices))
+    sections['neighbour_indptr'] = np.array(indptr, dtype='<u8')
+    sections['neighbour_indices'] = np.array(indices, dtype='<u4')
+    sections['neighbour_weights'] = np.array(weights, dtype='<f8')
+
+    stat = os.stat(source)
+    _write_sections(binary, sections, len(ids), stat.st_size, stat.st_mtime_ns)
+
+
+def read_catalogue(binary: str, phases: Optional[dict[str, float]] = None) \
+        -> tuple[dict[str, Game], DecisionTree, CSRGraph]:
+    """Return the games, decision tree and weighted graph stored in the binary catalogue, in the
+    same form load_games returns them.
+
+    The arrays of the graph are views of the memory-mapped file, and the urls and descriptions
+    of the games are only decoded from it when they are used.
+
+    If phases is not None, the seconds spent decoding the catalogue, building the tree and
+    building the graph are added to it (see LoadProgress in data_computations).
+
+    Raise a ValueError if the file is truncated or corrupt: its sections must lie within the
+    file and be consistent with each other (see _check_sections).
+
+    Preconditions:
+        - is_fresh(binary, source) for the csv the catalogue was built from
+    """
+    phases = {} if phases is None else phases
+    start = time.perf_counter()
+    with open(binary, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    sections = _map_sections(buffer)
+    n = struct.unpack_from(HEADER_FORMAT, buffer)[3]
+    _check_sections(sections, n)
+
+    text = {field: _decode_strings(sections[field + '_offsets'], sections[field])
+            for field in RESIDENT_TEXT_FIELDS}
+    texts = MappedTextStore(sections)
+    features, attr_masks, vocabulary = {}, [], FeatureVocabulary()
+    for attr_index, attr in enumerate(FEATURE_ATTRIBUTES):
+        names = _decode_strings(sections[attr + '_vocab_offsets'], sections[attr + '_vocab'])
+        indptr, indices = sections[attr + '_indptr'], sections[attr + '_indices']
+        attr_masks.append(vocabulary.csr_masks(attr_index, names, indptr, indices))
+        indptr = indptr.tolist()
+        features[attr] = [vocabulary.intern(names[k]
+                                            for k in indices[indptr[i]:indptr[i + 1]].tolist())
+                          for i in range(n)]
+    masks = list(zip(*attr_masks))
+
+    games = {}
+    prices = sections['numeric']['price'].tolist()
+    popularity_scores = sections['numeric']['popularity_score'].tolist()
+    genre_masks = sections['numeric']['genre_bits'].tolist()
+    for i in range(n):
+        game = Game(text['id_num'][i], text['name'][i], features['popular_tags'][i],
+                    features['game_details'][i], features['genre'][i],
+                    features['mature_content'][i], prices[i], popularity_scores[i],
+                    genre_masks[i], masks[i], texts, i, 0.0)
+        games[game.id_num] = game
+    start = _add_phase(phases, 'catalogue parse', start)
+
+    tree = DecisionTree()
+    for i in range(n):
+        tree.insert_mask(genre_masks[i], text['id_num'][i])
+    start = _add_phase(phases, 'tree build', start)
+
+    graph = CSRGraph(text['id_num'], sections['neighbour_indptr'],
+                     sections['neighbour_indices'], sections['neighbour_weights'])
+    _add_phase(phases, 'graph build', start)
+    return (games, tree, graph)
+
+
+def _add_phase(phases: dict[str, float], phase: str, start: float) -> float:
+    """Add the seconds since <start> to the given phase, and return the current time."""
+    now = time.perf_counter()
+    phases[phase] = phases.get(phase, 0.0) + now - start
+    return now
+
+
+class MappedTextStore(CachedTextStore):
+    """A TextStore reading the urls and descriptions of the games from the string sections of a
+    memory-mapped catalogue.
+
+    Nothing is decoded when the catalogue is loaded: the offset tables stay in the file, and a
+    text is only decoded when it is read.
+    """
+    # Private Instance Attributes:
+    #   - _sections: the sections of the catalogue
+    _sections: dict[str, np.ndarray]
+
+    def __init__(self, sections: dict[str, np.ndarray]) -> None:
+        CachedTextStore.__init__(self)
+        self._sections = sections
+
+    def _read(self, field: str, index: int) -> str:
+        """Decode the given field of the game at the given index from the catalogue."""
+        offsets = self._sections[field + '_offsets']
+        start, stop = int(offsets[index]), int(offsets[index + 1])
+        return self._sections[field][start:stop].tobytes().decode('utf-8')
+
+
+def _encode_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the offsets and the utf-8 blob storing the given strings."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype='<u8')
+    return (offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+def _decode_strings(offsets: np.ndarray, blob: np.ndarray) -> list[str]:
+    """Return the strings stored by _encode_strings."""
+    offsets, data = offsets.tolist(), blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _write_sections(binary: str, sections: dict[str, np.ndarray], n: int, source_size: int,
+                    source_mtime: int) -> None:
+    """Write the header, the section table and the 8-byte aligned sections to <binary>.
+
+    The file is written under a temporary name first, so that a reader never sees a partially
+    written catalogue.
+    """
+    offset = struct.calcsize(HEADER_FORMAT) + len(sections) * struct.calcsize(SECTION_FORMAT)
+    table, offsets = [], []
+    for name in sections:
+        offset += -offset % 8
+        offsets.append(offset)
+        dtype = b'numeric' if sections[name].dtype == NUMERIC_DTYPE \
+            else sections[name].dtype.str.encode()
+        table.append(struct.pack(SECTION_FORMAT, name.encode(), dtype, offset,
+                                 len(sections[name])))
+        offset += sections[name].nbytes
+
+    temp_name = binary + '.tmp'
+    with open(temp_name, 'wb') as file:
+        file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(sections), n, source_size,
+                               source_mtime))
+        file.write(b''.join(table))
+        for name, start in zip(sections, offsets):
+            file.write(b'\0' * (start - file.tell()))
+            file.write(sections[name].tobytes())
+    os.replace(temp_name, binary)
+
+
+def _read_header(binary: str) -> Optional[tuple]:
+    """Return the unpacked header of the binary catalogue, or None if the file does not exist or
+    is not a binary catalogue of the current version."""
+    try:
+        with open(binary, 'rb') as file:
+            header = struct.unpack(HEADER_FORMAT, file.read(struct.calcsize(HEADER_FORMAT)))
+    except (OSError, struct.error):
+        return None
+
+    if header[0] != MAGIC or header[1] != VERSION:
+        return None
+    return header
+
+
+def _map_sections(buffer: mmap.mmap) -> dict[str, np.ndarray]:
+    """Return the sections of the memory-mapped catalogue as read-only arrays, without copying.
+
+    Raise a ValueError if the section table or a section does not lie within the file.
+    """
+    try:
+        header = struct.unpack_from(HEADER_FORMAT, buffer)
+        sections = {}
+        for i in range(header[2]):
+            name, dtype, offset, length = struct.unpack_from(
+                SECTION_FORMAT, buffer,
+                struct.calcsize(HEADER_FORMAT) + i * struct.calcsize(SECTION_FORMAT))
+            dtype = NUMERIC_DTYPE if dtype.rstrip(b'\0') == b'numeric' \
+                else np.dtype(dtype.rstrip(b'\0').decode())
+            if offset + length * dtype.itemsize > len(buffer):
+                raise ValueError(f'section {name!r} ends after the end of the file')
+            sections[name.rstrip(b'\0').decode()] = np.frombuffer(buffer, dtype=dtype,
+                                                                  count=length, offset=offset)
+    except (struct.error, TypeError) as error:
+        raise ValueError(f'corrupt binary catalogue: {error}') from error
+    return sections
+
+
+def _check_sections(sections: dict[str, np.ndarray], n: int) -> None:
+    """Raise a ValueError unless the given sections are those of a catalogue of n games written
+    by write_catalogue: every section is there, the offset and indptr arrays have one item per
+    game plus one, are nondecreasing and stay within the arrays they index, and the indices stay
+    within their vocabulary or the games.
+    """
+    names = [name for field in TEXT_FIELDS for name in (field + '_offsets', field)] \
+        + ['numeric'] \
+        + [attr + suffix for attr in FEATURE_ATTRIBUTES
+           for suffix in ('_vocab_offsets', '_vocab', '_indptr', '_indices')] \
+        + ['neighbour_indptr', 'neighbour_indices', 'neighbour_weights']
+    missing = [name for name in names if name not in sections]
+    if missing != []:
+        raise ValueError(f'corrupt binary catalogue: missing sections {missing}')
+    if len(sections['numeric']) != n:
+        raise ValueError('corrupt binary catalogue: wrong number of games')
+
+    for field in TEXT_FIELDS:
+        _check_pointers(sections[field + '_offsets'], n, len(sections[field]))
+    for attr in FEATURE_ATTRIBUTES:
+        vocabulary_size = len(sections[attr + '_vocab_offsets']) - 1
+        _check_pointers(sections[attr + '_vocab_offsets'], vocabulary_size,
+                        len(sections[attr + '_vocab']))
+        _check_pointers(sections[attr + '_indptr'], n, len(sections[attr + '_indices']))
+        _check_indices(sections[attr + '_indices'], vocabulary_size)
+    _check_pointers(sections['neighbour_indptr'], n, len(sections['neighbour_indices']))
+    _check_indices(sections['neighbour_indices'], n)
+    if len(sections['neighbour_weights']) != len(sections['neighbour_indices']):
+        raise ValueError('corrupt binary catalogue: wrong number of neighbour weights')
+
+
+def _check_pointers(pointers: np.ndarray, n: int, size: int) -> None:
+    """Raise a ValueError unless <pointers> are the n + 1 nondecreasing offsets, from 0 to
+    <size>, of n items in an array of <size> items.
+
+    >>> _check_pointers(np.array([0, 2, 2, 5]), 3, 5)
+    >>> _check_pointers(np.array([0, 2, 1, 5]), 3, 5)
+    Traceback (most recent call last):
+    ...
+    ValueError: corrupt binary catalogue: invalid offsets
+    """
+    if len(pointers) != n + 1 or n < 0 or pointers[0] != 0 or pointers[-1] != size \
+            or np.any(pointers[1:] < pointers[:-1]):
+        raise ValueError('corrupt binary catalogue: invalid offsets')
+
+
+def _check_indices(indices: np.ndarray, n: int) -> None:
+    """Raise a ValueError unless every item of <indices> is less than n."""
+    if len(indices) > 0 and indices.max() >= n:
+        raise ValueError('corrupt binary catalogue: index out of range')
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'mmap', 'os', 'struct', 'time', 'typing',
+                          'numpy', 'weighted_decision'],
+        'allowed-io': ['read_catalogue', '_write_sections', '_read_header'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
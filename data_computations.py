@@ -13,11 +13,30 @@ copyright for CSC111 project materials, please consult our Course Syllabus.
 
 This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
 """
+from collections.abc import Iterable, Iterator
 import csv
-import urllib.request
+import functools
+import heapq
+import io
+import time
+from typing import BinaryIO, Optional
 import json
-import random
-from weighted_decision import Game, DecisionTree, WeightedGraph
+import re
+import catalogue
+from weighted_decision import Game, DecisionTree, WeightedGraph, CSRGraph, CSRGraphBuilder, \
+    BoundedGraphBuilder, FeatureIndex, FeatureVocabulary, ListTextStore, CachedTextStore, \
+    FEATURE_ATTRIBUTES, NUM_QUESTIONS, pack_genre_bools
+
+# Base url of the Steam API method returning the games owned by a user
+STEAM_API_URL = 'http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/'
+
+# Header of the final games csv
+FINAL_CSV_HEADER = ['url', 'id_num', 'name', 'popular_tags', 'game_details', 'genre',
+                    'game_description', 'mature_content', 'price', 'popularity_score',
+                    'genre_bools', 'neighbours', 'similarity_scores']
+
+# Columns of the final games csv holding the fields in LAZY_TEXT_FIELDS
+FINAL_CSV_TEXT_COLUMNS = {'url': 0, 'game_description': 6}
 
 
 # Keyword sets in mature content description, used for similarity scores
@@ -33,51 +52,264 @@ SEX_KEYWORDS = {'sex', 'sexual', 'sexually', 'sexy', 'nude', 'nudity', 'naked',
 GENERAL_KEYWORDS = {'general', 'cursing', 'language', 'profanity', 'swearing', 'ages', 'trauma',
                     'mature', 'adult', 'sensitive', 'disturbing', 'uncomfortable', 'depression'}
 
+# Maps every keyword above to its category; a keyword in several sets gets the category of the
+# first set, so the sets are listed in reverse
+MATURE_CATEGORIES = {word: category
+                     for category, keywords in [('general', GENERAL_KEYWORDS),
+                                                ('sex', SEX_KEYWORDS),
+                                                ('horror', HORROR_KEYWORDS),
+                                                ('addiction', ADDICTION_KEYWORDS),
+                                                ('violence', VIOLENCE_KEYWORDS)]
+                     for word in keywords}
+
+# Number of words at the start of every mature content description, before the description
+# written by the developers
+MATURE_CONTENT_PREAMBLE = 10
+
+# Maps the genres of the original csv to the genre question (see get_genre_bools) they answer
+GENRE_QUESTIONS = {'Action': 0, 'Adventure': 1, 'Strategy': 2, 'RPG': 3, 'Simulation': 4,
+                   'Casual': 5, 'Indie': 6, 'Racing': 7, 'Sports': 7}
+
+ID_PATTERN = re.compile(r'\d+')
+REVIEWS_PATTERN = re.compile(r'(\d+)% of the ([\d,]+) user reviews')
+
+
+# Number of (answers, 'I don't care' answers) pairs whose nearest_masks order is cached
+MASK_ORDER_CACHE_SIZE = 256
+
+# Number of rows load_games_csv reads between two updates of its LoadProgress
+PROGRESS_INTERVAL = 256
+
+
+class LoadProgress:
+    """The progress of load_games, which can be read from another thread while it runs.
 
-def load_games(filename: str = 'data/final_games.csv')\
-        -> tuple[dict[str, Game], DecisionTree, WeightedGraph]:
+    Instance Attributes:
+        - fraction: the fraction of the catalogue loaded so far, from 0 to 1
+        - phases: maps the name of each phase of the startup to the seconds spent in it, in the
+          order they were first recorded
+        - start: the time the startup started, from time.perf_counter
+
+    Representation Invariants:
+        - 0 <= self.fraction <= 1
+        - all(self.phases[phase] >= 0 for phase in self.phases)
+    """
+    fraction: float
+    phases: dict[str, float]
+    start: float
+
+    def __init__(self, start: Optional[float] = None) -> None:
+        self.fraction = 0.0
+        self.phases = {}
+        self.start = time.perf_counter() if start is None else start
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        """Add <seconds> to the time spent in the given phase."""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def report(self) -> str:
+        """Return a table of the time spent in each phase, and the time since the start.
+
+        Phases may overlap (the catalogue is loaded while the window opens), so their sum can
+        be more than the time since the start.
+
+        >>> progress = LoadProgress(start=time.perf_counter())
+        >>> progress.add_time('csv parse', 0.25)
+        >>> print(progress.report().splitlines()[0])
+        csv parse                   250.0 ms
+        """
+        lines = [f'{phase:24s} {seconds * 1000:8.1f} ms' for phase, seconds in self.phases.items()]
+        lines.append(f'{"ready after":24s} {(time.perf_counter() - self.start) * 1000:8.1f} ms')
+        return '\n'.join(lines)
+
+
+def load_games(filename: str = 'data/final_games.csv', progress: Optional[LoadProgress] = None)\
+        -> tuple[dict[str, Game], DecisionTree, CSRGraph]:
     """Return a tuple of three objects:
         1. A dictionary of games. Each key is a game id; each item is a game object.
         2. A decision tree classifying games in terms of genre.
         3. A weighted graph linking similar games together.
+
+    The memory-mapped binary catalogue next to <filename> is read instead of the csv, unless it
+    is missing, older than the csv, truncated or corrupt.
+
+    If progress is not None, the fraction of the catalogue loaded and the time spent in each
+    phase of the loading are recorded in it.
+    """
+    progress = LoadProgress() if progress is None else progress
+    binary = catalogue.binary_name(filename)
+    system_objects = None
+    if catalogue.is_fresh(binary, filename):
+        try:
+            system_objects = catalogue.read_catalogue(binary, progress.phases)
+        except ValueError:
+            pass  # a truncated or corrupt catalogue: the csv is read instead
+    if system_objects is None:
+        system_objects = load_games_csv(filename, progress)
+
+    start = time.perf_counter()
+    rank_popularity(system_objects[0])
+    progress.add_time('popularity ranking', time.perf_counter() - start)
+    progress.fraction = 1.0
+    return system_objects
+
+
+def load_games_csv(filename: str, progress: Optional[LoadProgress] = None) \
+        -> tuple[dict[str, Game], DecisionTree, CSRGraph]:
+    """Return the same tuple as load_games, parsed from the final games csv.
+
+    Only the byte offset of each row is kept for the urls and descriptions, which are read again
+    from the csv when they are used (see CsvTextStore).
+
+    If progress is not None, the fraction of the file read is recorded in it every
+    PROGRESS_INTERVAL rows, along with the time spent parsing rows, building the tree and
+    building the graph.
     """
+    progress = LoadProgress() if progress is None else progress
     games = {}
-    tree = DecisionTree(set())
-    graph = WeightedGraph()
-    with open(filename, errors='ignore') as csv_file:
-        reader = csv.reader(csv_file)
+    tree = DecisionTree()
+    graph = CSRGraphBuilder()
+    vocabulary, texts = FeatureVocabulary(), CsvTextStore(filename)
+    # the seconds spent parsing the rows, building the tree, and building the graph
+    times = [0.0, 0.0, 0.0]
+    with open(filename, 'rb') as csv_file:
+        size = max(csv_file.seek(0, io.SEEK_END), 1)
+        csv_file.seek(0)
+        position = [0]
+        reader = csv.reader(_decode_lines(csv_file, position))
         next(reader, None)
+        start = position[0]
+        last = time.perf_counter()
         for row in reader:
-            game = Game(row[0], row[1], row[2], set(row[3].split(',')), set(row[4].split(',')),
-                        set(row[5].split(',')), row[6], set(row[7].split(',')), float(row[8]),
-                        float(row[9]), [x == 'True' for x in row[10].split(',')], 0.0)
+            feature_sets = (vocabulary.intern(row[3].split(',')),
+                            vocabulary.intern(row[4].split(',')),
+                            vocabulary.intern(row[5].split(',')),
+                            vocabulary.intern(row[7].split(',')))
+            game = Game(row[1], row[2], *feature_sets, float(row[8]), float(row[9]),
+                        pack_genre_bools([x == 'True' for x in row[10].split(',')]),
+                        vocabulary.masks(feature_sets), texts, texts.add(start), 0.0)
+            start = position[0]
             games[game.id_num] = game
-            tree.insert_game(game.genre_bools, game.id_num)
+            last = _add_elapsed(times, 0, last)
+            tree.insert_mask(game.genre_mask, game.id_num)
+            last = _add_elapsed(times, 1, last)
             graph.add_vertex(game.id_num)
             neighbours, sim_scores = row[11].split(';'), row[12].split(',')
             for i in range(len(neighbours)):
                 if neighbours[i] in games:
                     graph.add_edge(game.id_num, neighbours[i], float(sim_scores[i]))
+            last = _add_elapsed(times, 2, last)
+            if len(games) % PROGRESS_INTERVAL == 0:
+                progress.fraction = start / size
 
-    return (games, tree, graph)
+    system_objects = (games, tree, graph.build())
+    _add_elapsed(times, 2, last)
+    for phase, seconds in zip(['csv parse', 'tree build', 'graph build'], times):
+        progress.add_time(phase, seconds)
+    return system_objects
 
 
-def pop_score_computation(games: dict[str, Game], game_lst: list[str]) -> None:
-    """Update the recommendation scores of the games in game_set based on their popularity scores.
+def _add_elapsed(times: list[float], phase: int, last: float) -> float:
+    """Add the seconds since <last> to times[phase], and return the current time."""
+    now = time.perf_counter()
+    times[phase] += now - last
+    return now
 
-    Preconditions:
-        - len(game_lst) > 0
+
+class CsvTextStore(CachedTextStore):
+    """A TextStore reading the urls and descriptions of the games from the final games csv.
+
+    Only the byte offset of the row of each game is kept in memory.
+    """
+    # Private Instance Attributes:
+    #   - _filename: the name of the final games csv
+    #   - _offsets: the byte offset of the row of each game in the csv
+    _filename: str
+    _offsets: list[int]
+
+    def __init__(self, filename: str) -> None:
+        CachedTextStore.__init__(self)
+        self._filename = filename
+        self._offsets = []
+
+    def add(self, offset: int) -> int:
+        """Add the game whose row starts at the given byte offset and return its index."""
+        self._offsets.append(offset)
+        return len(self._offsets) - 1
+
+    def _read(self, field: str, index: int) -> str:
+        """Read the given field of the game at the given index from the csv."""
+        with open(self._filename, 'rb') as csv_file:
+            csv_file.seek(self._offsets[index])
+            row = next(csv.reader(_decode_lines(csv_file, [0])))
+        return row[FINAL_CSV_TEXT_COLUMNS[field]]
+
+
+def _decode_lines(csv_file: BinaryIO, position: list[int]) -> Iterator[str]:
+    """Yield the lines of a csv file opened in binary mode, decoded the same way as a file
+    opened with errors='ignore'. position[0] is increased by the size of each line in bytes
+    before it is yielded.
+    """
+    for line in csv_file:
+        position[0] += len(line)
+        yield line.decode('utf-8', errors='ignore').replace('\r\n', '\n')
+
+
+def rank_popularity(games: dict[str, Game]) -> None:
+    """Set the popularity rank of every game: the k-th least popular of n games gets k / n.
+
+    Games with the same popularity score are ranked in catalogue order.
     """
-    ranked_games = sorted(game_lst, key=lambda game: games[game].popularity_score)
+    ranked_games = sorted(games, key=lambda game: games[game].popularity_score)
     for i in range(1, len(ranked_games) + 1):
-        games[ranked_games[i - 1]].recommendation_score += i / len(ranked_games)
+        games[ranked_games[i - 1]].popularity_rank = i / len(ranked_games)
+
+
+def pop_score_computation(games: dict[str, Game], game_lst: list[str],
+                          scores: dict[str, float]) -> None:
+    """Update the recommendation scores of the games in game_lst based on their popularity.
+
+    Each game gets its popularity rank in the whole catalogue, which rank_popularity computes
+    once when the catalogue is loaded.
+    """
+    for game in game_lst:
+        add_score(scores, game, games[game].popularity_rank)
+
+
+def select_top_games(scores: dict[str, float], game_set: set[str], n: int = 9) -> list[str]:
+    """Return the ids of the <n> games in game_set with the highest recommendation scores, from
+    highest to lowest.
+
+    Games with the same score are returned in the order of game_set. Only the n best games
+    are kept while game_set is scanned, instead of sorting the whole set.
+
+    Preconditions:
+        - n >= 0
+    """
+    return heapq.nlargest(n, game_set, key=lambda game: scores.get(game, 0.0))
 
 
-def graph_computation(games: dict[str, Game], graph: WeightedGraph, user_data: dict[str: dict],
-                      game_set: set[str]) -> None:
+def add_score(scores: dict[str, float], game: str, score: float) -> None:
+    """Add <score> to the recommendation score of <game> in scores.
+
+    Recommendation scores are kept in a dictionary owned by one recommendation session, instead
+    of on the Game objects, so that the loaded catalogue is never mutated and can be shared by
+    several sessions at once. Games without an entry have a score of 0.
+
+    >>> scores = {}
+    >>> add_score(scores, '1', 2.5)
+    >>> add_score(scores, '1', 2.5)
+    >>> scores
+    {'1': 5.0}
+    """
+    scores[game] = scores.get(game, 0.0) + score
+
+
+def graph_computation(games: dict[str, Game], graph: CSRGraph, user_data: dict[str: dict],
+                      game_set: set[str], scores: dict[str, float]) -> None:
     """Extract the games that the user plays on their steam account identified by their user_id,
     and use this information to add new games to game_set and update their recommendation
-    scores.
+    scores in <scores>.
 
     The recommendation score is based on how long the user played on each of the games
     in their steam library and the similarity score between the games on the graph.
@@ -95,83 +327,430 @@ def graph_computation(games: dict[str, Game], graph: WeightedGraph, user_data: d
         if game in game_set:  # remove the game from game_set if it's already been played
             game_set.remove(game)
 
-        neighbours = graph.get_neighbours(game)  # a dict that maps neighbors to sim scores
-        for neighbour in neighbours:
+        neighbours = graph.get_neighbours(game)  # a mapping from neighbors to sim scores
+        # items() reads the weights along with the ids, without looking each neighbour up
+        for neighbour, weight in neighbours.items():
             # making sure the neighbour is not already a game in the user's steam library
             # though it may be already in game_set!
             if neighbour not in played_games:
-                score = neighbours[neighbour] + played_games[game] / 1000
-                games[neighbour].recommendation_score += score
+                score = weight + played_games[game] / 1000
+                add_score(scores, neighbour, score)
                 game_set.add(neighbour)
 
 
-def tree_computation(games: dict[str, Game], tree: DecisionTree, answers: list[bool],
-                     indices: list[int], game_set: set[str]) -> None:
+def tree_computation(tree: DecisionTree, answers: list[bool], indices: list[int],
+                     game_set: set[str], scores: dict[str, float], n: int = 9) -> None:
     """Add new games to game_set based on user answers and the decision tree and update
-    their recommendation scores.
-
-    This function guarantees that there will be at least 9 games in game_set.
-
-    Indices are a list of indexes where the user selected 'I don't care'. The more we have to
-    change the user's answers in order to get more games, the less the recommendation scores will
-    be for those extra games added.
-    """
-    new_games = tree.find_games_from_answers(answers)
-    for game in new_games:
-        games[game].recommendation_score += 5
-    game_set.update(new_games)
-
-    iter_times = 0
-    while len(game_set) < 9:
-        if len(indices) > 0:
-            index, score = indices.pop(), 5 / (iter_times + 1)
-        else:
-            index, score = random.randint(0, 8), 2.5 / (iter_times + 1)
-        answers[index] = not answers[index]
-        new_games = tree.find_games_from_answers(answers)
-        for game in new_games:
-            if game not in game_set:
-                games[game].recommendation_score += score
-        game_set.update(new_games)
-        iter_times += 1
-
-
-def read_json_data(user_id: str) -> dict[str: dict]:
+    their recommendation scores in <scores>.
+
+    This function guarantees that there will be at least n games in game_set, as long as the
+    tree has at least n games.
+
+    Indices are a list of indexes where the user selected 'I don't care'. If there are not enough
+    games with exactly the user's answers, the games whose answers are nearest in Hamming
+    distance are added, changing answers at these indices first. The more answers differ, the
+    less the recommendation scores will be for those extra games added (see mask_score).
+    """
+    target = pack_genre_bools(answers)
+    free = pack_genre_bools([i in indices for i in range(NUM_QUESTIONS)])
+
+    for game in tree.find_games_from_mask(target):
+        add_score(scores, game, 5)
+    game_set.update(tree.find_games_from_mask(target))
+
+    for mask in nearest_masks(target, free):
+        if len(game_set) >= n:
+            break
+        if tree.num_games(mask) > 0:
+            score = mask_score(target ^ mask, free)
+            new_games = tree.find_games_from_mask(mask)
+            for game in new_games:
+                if game not in game_set:
+                    add_score(scores, game, score)
+            game_set.update(new_games)
+
+
+@functools.lru_cache(maxsize=MASK_ORDER_CACHE_SIZE)
+def nearest_masks(target: int, free: int) -> tuple[int, ...]:
+    """Return every bitmask of answers other than <target>, from nearest to farthest.
+
+    Masks are ordered by the number of answers they change outside of <free> (the 'I don't care'
+    answers), then by the number of answers they change inside of <free>, then by value. The
+    masks are only sorted the first time a pair of target and free is seen; later calls return
+    the cached tuple.
+
+    >>> nearest_masks(0b0, 0b10)[:4]
+    (2, 1, 4, 8)
+    >>> nearest_masks(0b0, 0b10) is nearest_masks(0b0, 0b10)
+    True
+    """
+    masks = [target ^ diff for diff in range(1, 2 ** NUM_QUESTIONS)]
+    return tuple(sorted(masks, key=lambda mask: (bin((mask ^ target) & ~free).count('1'),
+                                                 bin((mask ^ target) & free).count('1'), mask)))
+
+
+def mask_score(diff: int, free: int) -> float:
+    """Return the recommendation score of a game whose answers differ from the user's answers
+    by the bits of <diff>, where <free> are the answers the user does not care about.
+
+    Changing only free answers scores 5 / (number changed); changing any other answer scores
+    2.5 / (total number changed).
+
+    >>> mask_score(0b11, 0b11)
+    2.5
+    >>> mask_score(0b11, 0b01)
+    1.25
+    """
+    changed = bin(diff).count('1')
+    if diff & ~free == 0:
+        return 5 / changed
+    else:
+        return 2.5 / changed
+
+
+def read_json_data(user_id: str, base_url: str = STEAM_API_URL,
+                   timeout: Optional[float] = None) -> dict[str: dict]:
     """Get steam library json data from web. (In case website fails, use local file)
 
     Return a dictionary like {'response': {'game_count': int, 'games': List(dict)}}
+
+    The request is sent to <base_url>, which can point to a local server for testing, and gives
+    up after <timeout> seconds if it is not None.
     """
-    url = "http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/" \
-          "?key=F4D77259D3E7B5E62801D809111A12CC&steamid=" + user_id + "=json"
-    response = urllib.request.urlopen(url)
+    import urllib.request  # only imported when the Steam API is used
+
+    url = base_url + "?key=F4D77259D3E7B5E62801D809111A12CC&steamid=" + user_id + "=json"
+    response = urllib.request.urlopen(url, timeout=timeout)
     data = json.loads(response.read())
 
     return data
 
 
 def read_csv(input_name: str = 'data/sample_original_games.csv',
-             output_name: str = 'data/sample_final_games.csv') -> None:
+             output_name: str = 'data/sample_final_games.csv', vectorized: bool = False,
+             workers: int = 1, max_neighbours: Optional[int] = None) -> None:
     """Read the input csv and write a clean csv that stores the attributes of Game and the
     neighbours + sim scores of the graph. Remove games with missing data in url, name, all reviews,
     popular tags, game details, and genre.
+
+    If vectorized is True, the similarity scores are computed in blocks with NumPy by
+    similarity_engine.build_graph instead of one pair at a time, using <workers> processes.
+    The rows of the input csv are also filtered and parsed by <workers> processes.
+    Setting workers > 1 implies vectorized.
+
+    If max_neighbours is not None, each game keeps at most that many neighbours: an edge is
+    only written if it is among the max_neighbours heaviest edges of both of its games.
+
+    If a game id is repeated, the game keeps the position of its first row and the data of its
+    last row, and it is compared with the other games when its last row is read.
+
+    Preconditions:
+        - workers > 0
+        - max_neighbours is None or max_neighbours > 0
     """
-    games = {}
-    graph = WeightedGraph()
-    with open(input_name, errors='ignore') as csv_file:
+    order = []
+    games = read_tidy_games(input_name, workers, order)
+    if vectorized or workers > 1:
+        import similarity_engine  # only imported when preprocessing, since it is large
+
+        write_csv(output_name, games,
+                  similarity_engine.build_graph(games, workers=workers,
+                                                max_neighbours=max_neighbours, order=order))
+        write_binary_catalogue(output_name)
+        return
+
+    graph = WeightedGraph() if max_neighbours is None else BoundedGraphBuilder(max_neighbours)
+    positions = {}
+    for id_num in games:
+        graph.add_vertex(id_num)
+        positions[id_num] = len(positions)
+
+    index = FeatureIndex()
+    for id_num in order:
+        for other in find_candidates(games, index, games[id_num], positions):
+            weight = compute_similarity(games[id_num], games[other])
+            if weight > 2:
+                graph.add_edge(other, id_num, weight)
+        index.add_game(games[id_num])
+
+    if max_neighbours is not None:
+        graph = graph.build()
+    write_csv(output_name, games, graph)
+    write_binary_catalogue(output_name)
+
+
+def update_catalogue(filename: str, new_rows: list[list[str]], removed_ids: Iterable[str] = (),
+                     max_neighbours: Optional[int] = None) -> None:
+    """Update the final games csv <filename> and its binary catalogue with the given rows of the
+    original csv, without recomputing the similarity of the games that did not change.
+
+    First, the games in <removed_ids> are removed with their edges. Then every tidy row of
+    <new_rows> is added: a new game is added at the end of the catalogue, and a game that is
+    already there keeps its position but loses its old edges. Only the added games are scored,
+    against the whole catalogue with similarity_engine, and their edges are added to the
+    neighbour lists of both of their games. The time taken grows with the number of added games
+    times the size of the catalogue, instead of the square of the size of the catalogue.
+
+    The rows of the games that did not change are written back as they were read. Without
+    max_neighbours, the result is the same as rebuilding the catalogue from the original csv.
+    Otherwise, the neighbour lists that became longer than max_neighbours are cut down with the
+    rule of BoundedGraphBuilder, applied to the edges in the final csv. The edges cut when the
+    catalogue was built are not there, so the result is not always that of a rebuild: after
+    adding games, every edge of a rebuild is kept, but so can be edges a rebuild would cut, and
+    edges cut by the build are not restored when a game is removed.
+
+    Preconditions:
+        - max_neighbours is None or max_neighbours > 0
+    """
+    import similarity_engine  # only imported when preprocessing, since it is large
+
+    vocabulary = FeatureVocabulary()
+    columns, games, graph = read_final_csv(filename, vocabulary)
+    for id_num in removed_ids:
+        if id_num in games:
+            graph.remove_vertex(id_num)
+            del games[id_num], columns[id_num]
+
+    texts, changed = ListTextStore(), {}
+    for row in new_rows:
+        if check_tidiness(row):
+            # the new game is compared with features as they are stored in the final csv
+            new_columns = game_columns(init_game_obj(row, texts, vocabulary))
+            game = game_from_columns(new_columns, texts, vocabulary)
+            if game.id_num in games:
+                graph.remove_vertex(game.id_num)
+            graph.add_vertex(game.id_num)
+            games[game.id_num], columns[game.id_num] = game, new_columns
+            changed[game.id_num] = None
+
+    features = similarity_engine.encode_games(list(games.values()))
+    position = {features.ids[i]: i for i in range(len(features.ids))}
+    for i, j, weight in similarity_engine.row_pairs(features, [position[id_num]
+                                                               for id_num in changed]):
+        graph.add_edge(features.ids[i], features.ids[j], weight)
+
+    if max_neighbours is not None:
+        cut_neighbours(graph, features.ids, max_neighbours)
+
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(FINAL_CSV_HEADER)
+        for id_num in games:
+            d = graph.get_neighbours(id_num)
+            neighbours = sorted(d, key=position.get)
+            writer.writerow(columns[id_num] + neighbour_columns(
+                neighbours, [d[neighbour] for neighbour in neighbours]))
+    write_binary_catalogue(filename)
+
+
+def read_final_csv(filename: str, vocabulary: Optional[FeatureVocabulary] = None) \
+        -> tuple[dict[str, list[str]], dict[str, Game], WeightedGraph]:
+    """Return the game columns (see game_columns) of every row of the final games csv, the games
+    they store, and their similarity graph.
+
+    Unlike load_games_csv, games without mature content have an empty set of mature content,
+    so that they can be compared with new games. To compare them with compute_similarity, the
+    new games must be built with the same vocabulary, which is a new one by default.
+    """
+    vocabulary = FeatureVocabulary() if vocabulary is None else vocabulary
+    columns, games, graph, texts = {}, {}, WeightedGraph(), ListTextStore()
+    with open(filename, errors='ignore', newline='') as csv_file:
         reader = csv.reader(csv_file)
         next(reader, None)
         for row in reader:
-            if check_tidiness(row):
-                game = init_game_obj(row)
-                games[game.id_num] = game
-                graph.add_vertex(game.id_num)
-                for id_num in games:
-                    if id_num != game.id_num:
-                        weight = compute_similarity(game, games[id_num])
-                        if weight > 2:
-                            graph.add_edge(id_num, game.id_num, weight)
+            game = game_from_columns(row, texts, vocabulary)
+            columns[game.id_num], games[game.id_num] = row[:len(FINAL_CSV_HEADER) - 2], game
+            graph.add_vertex(game.id_num)
+            if row[11] != '':
+                sim_scores = row[12].split(',')
+                for i, neighbour in enumerate(row[11].split(';')):
+                    if neighbour in games:
+                        graph.add_edge(game.id_num, neighbour, float(sim_scores[i]))
+
+    return (columns, games, graph)
+
+
+def game_from_columns(columns: list, texts: ListTextStore, vocabulary: FeatureVocabulary) -> Game:
+    """Return the game stored in the given game columns of the final games csv (see
+    game_columns). Its url and description are added to <texts>, and its feature masks are given
+    by <vocabulary>.
+    """
+    feature_sets = (frozenset(columns[3].split(',')), frozenset(columns[4].split(',')),
+                    frozenset(columns[5].split(',')),
+                    frozenset(columns[7].split(',')) if columns[7] != '' else frozenset())
+    return Game(columns[1], columns[2], *feature_sets, float(columns[8]), float(columns[9]),
+                pack_genre_bools([x == 'True' for x in columns[10].split(',')]),
+                vocabulary.masks(feature_sets), texts, texts.add((columns[0], columns[6])), 0.0)
+
+
+def cut_neighbours(graph: WeightedGraph, ids: list[str], max_neighbours: int) -> None:
+    """Remove every edge of the graph that is not among the max_neighbours heaviest edges of
+    both of its games. Ties are broken in favour of the games that come first in <ids>.
+
+    Preconditions:
+        - set(ids) is the set of vertices of graph
+        - max_neighbours > 0
+    """
+    position = {ids[i]: i for i in range(len(ids))}
+    kept = {}
+    for id_num in ids:
+        d = graph.get_neighbours(id_num)
+        if len(d) > max_neighbours:
+            kept[id_num] = set(heapq.nlargest(max_neighbours, d,
+                                              key=lambda n: (d[n], -position[n])))
+
+    for id_num in kept:
+        for neighbour in graph.get_neighbours(id_num):
+            if neighbour not in kept[id_num] or (neighbour in kept
+                                                 and id_num not in kept[neighbour]):
+                graph.remove_edge(id_num, neighbour)
+
+
+def write_binary_catalogue(filename: str) -> None:
+    """Write the binary catalogue of the final games csv <filename>, to be memory-mapped by
+    load_games.
+
+    The catalogue is built from the csv as load_games_csv reads it, so both give the same games.
+    """
+    games, _, graph = load_games_csv(filename)
+    catalogue.write_catalogue(catalogue.binary_name(filename), games, graph, filename)
+
+
+def read_tidy_games(input_name: str, workers: int = 1,
+                    order: Optional[list[str]] = None) -> dict[str, Game]:
+    """Return a dictionary mapping game ids to the game objects of every tidy row of the
+    original csv.
+
+    A game id that is repeated keeps the position of its first row and the data of its last
+    row. If order is not None, the game ids are appended to it in the order their last rows
+    were read.
+
+    If workers > 1, the csv is split into that many chunks of rows (see record_boundaries),
+    which are filtered and parsed by a pool of processes. The games are the same, in the same
+    order, as with a single process.
+
+    Preconditions:
+        - workers > 0
+    """
+    games, texts, vocabulary, last_read = {}, ListTextStore(), FeatureVocabulary(), {}
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with open(input_name, 'rb') as csv_file:
+            boundaries = record_boundaries(csv_file.read(), workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = executor.map(parse_tidy_rows, [input_name] * (len(boundaries) - 1),
+                                  boundaries[:-1], boundaries[1:])
+            for records in chunks:
+                for record in records:
+                    _add_tidy_game(games, last_read,
+                                   game_from_record(record, texts, vocabulary))
+    else:
+        with open(input_name, errors='ignore') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)
+            for row in reader:
+                if check_tidiness(row):
+                    _add_tidy_game(games, last_read, init_game_obj(row, texts, vocabulary))
+
+    if order is not None:
+        order.extend(last_read)
+    return games
+
+
+def _add_tidy_game(games: dict[str, Game], last_read: dict[str, None], game: Game) -> None:
+    """Add the game of a tidy row to <games>, and move its id to the end of <last_read>."""
+    games[game.id_num] = game
+    last_read.pop(game.id_num, None)
+    last_read[game.id_num] = None
+
+
+def record_boundaries(data: bytes, num_chunks: int) -> list[int]:
+    """Return the byte offsets splitting the rows of the csv <data>, after its header, into at
+    most num_chunks chunks of about the same size, followed by len(data).
+
+    Every offset is the start of a row: a chunk boundary is moved forward to the end of the
+    first line after it at which an even number of quotes has been seen, so that quoted fields
+    spanning several lines are never split.
+
+    Preconditions:
+        - num_chunks > 0
+
+    >>> data = b'a,b\\n1,"x\\ny"\\n2,z\\n'
+    >>> record_boundaries(data, 3)
+    [4, 12, 16]
+    """
+    boundaries, position, quotes = [], 0, 0
+    for k in range(num_chunks):
+        target = max(len(data) * k // num_chunks, position)
+        quotes += data.count(b'"', position, target)
+        position = target
+        while position < len(data):
+            end = data.find(b'\n', position)
+            end = len(data) if end == -1 else end + 1
+            quotes += data.count(b'"', position, end)
+            position = end
+            if quotes % 2 == 0:
+                break
+        if boundaries == [] or position > boundaries[-1]:
+            boundaries.append(position)
+
+    if boundaries[-1] < len(data):
+        boundaries.append(len(data))
+    return boundaries
+
+
+def parse_tidy_rows(input_name: str, start: int, stop: int) -> list[tuple]:
+    """Return the records (see parse_row) of the tidy rows of the original csv between the byte
+    offsets start and stop.
+
+    The bytes are decoded the same way as open(input_name, errors='ignore') decodes them.
+
+    Preconditions:
+        - start and stop are offsets returned by record_boundaries
+    """
+    with open(input_name, 'rb') as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(stop - start)
+
+    reader = csv.reader(io.TextIOWrapper(io.BytesIO(data), errors='ignore'))
+    return [parse_row(row) for row in reader if check_tidiness(row)]
 
-    write_csv(output_name, games, graph)
+
+def find_candidates(games: dict[str, Game], index: FeatureIndex, game: Game,
+                    positions: dict[str, int]) -> list[str]:
+    """Return the ids of the indexed games whose similarity score with <game> may be above 2,
+    in the order of their <positions>.
+
+    Games that share no feature with <game> have a similarity score of at most 0.5, so only
+    the games returned by index.shared_features are checked, and only the ones whose upper bound
+    from max_similarity is above 2 are kept.
+    """
+    shared = index.shared_features(game)
+    candidates = [id_num for id_num in shared
+                  if max_similarity(game, games[id_num], shared[id_num]) > 2]
+    candidates.sort(key=positions.get)
+    return candidates
+
+
+def max_similarity(game1: Game, game2: Game, shared: list[int]) -> float:
+    """Return an upper bound of compute_similarity(game1, game2), given the number of features
+    the two games share in each of popular_tags, game_details, genre, and mature_content.
+
+    Each of the first three terms (size of intersection / size of union) is at most
+    size of intersection / max(len(A), len(B)), and the mature content term only depends on
+    the size of the intersection.
+    """
+    bound = 0.0
+    for i in range(3):
+        if shared[i] > 0:
+            bound += shared[i] / max(len(getattr(game1, FEATURE_ATTRIBUTES[i])),
+                                     len(getattr(game2, FEATURE_ATTRIBUTES[i])))
+
+    if game1.mature_content != set() and game2.mature_content != set():
+        bound += max(0.5, shared[3])
+
+    return bound
 
 
 def check_tidiness(row: list) -> bool:
@@ -200,59 +779,69 @@ def write_csv(filename: str, games: dict[str, Game], graph: WeightedGraph) -> No
     """
     with open(filename, 'w', newline='') as file:
         writer = csv.writer(file)
-        writer.writerow(["url",
-                         "id_num",
-                         "name",
-                         "popular_tags",
-                         "game_details",
-                         "genre",
-                         "game_description",
-                         "mature_content",
-                         "price",
-                         "popularity_score",
-                         "genre_bools",
-                         "neighbours",
-                         "similarity_scores"])
+        writer.writerow(FINAL_CSV_HEADER)
         for id_num in games:
-            game = games[id_num]
-
-            neighbours, similarity_scores = [], []
             d = graph.get_neighbours(id_num)
-            for neighbour in d:
-                neighbours.append(neighbour)
-                similarity_scores.append(round(d[neighbour], 4))
-
-            writer.writerow([game.url,
-                             game.id_num,
-                             game.name,
-                             str(game.popular_tags)[1:-1].replace(' ', '').replace('\'', ''),
-                             str(game.game_details)[1:-1].replace(' ', '').replace('\'', ''),
-                             str(game.genre)[1:-1].replace(' ', '').replace('\'', ''),
-                             game.game_description,
-                             str(list(game.mature_content))[1:-1].replace(' ', '').replace('\'',
-                                                                                           ''),
-                             game.price,
-                             game.popularity_score,
-                             str(game.genre_bools)[1:-1].replace(' ', ''),
-                             str(neighbours)[1:-1].replace(', ', ';').replace('\'', ''),
-                             str(similarity_scores)[1:-1].replace(' ', '')])
-
-
-def init_game_obj(row: list) -> Game:
-    """Initialize a game object.
+            writer.writerow(game_columns(games[id_num])
+                            + neighbour_columns(list(d), [d[neighbour] for neighbour in d]))
+
+
+def game_columns(game: Game) -> list:
+    """Return the columns of the final games csv storing the attributes of <game>, in the order
+    of FINAL_CSV_HEADER.
+    """
+    return [game.url,
+            game.id_num,
+            game.name,
+            str(list(game.popular_tags))[1:-1].replace(' ', '').replace('\'', ''),
+            str(list(game.game_details))[1:-1].replace(' ', '').replace('\'', ''),
+            str(list(game.genre))[1:-1].replace(' ', '').replace('\'', ''),
+            game.game_description,
+            str(list(game.mature_content))[1:-1].replace(' ', '').replace('\'', ''),
+            game.price,
+            game.popularity_score,
+            str(game.genre_bools)[1:-1].replace(' ', '')]
+
+
+def neighbour_columns(neighbours: list[str], weights: list[float]) -> list[str]:
+    """Return the neighbours and similarity_scores columns of the final games csv, for the given
+    neighbours and the weights of their edges.
+
+    >>> neighbour_columns(['10', '20'], [2.123456, 3.0])
+    ['10;20', '2.1235,3.0']
+    """
+    similarity_scores = [round(weight, 4) for weight in weights]
+    return [str(neighbours)[1:-1].replace(', ', ';').replace('\'', ''),
+            str(similarity_scores)[1:-1].replace(' ', '')]
+
+
+def init_game_obj(row: list, texts: ListTextStore, vocabulary: FeatureVocabulary) -> Game:
+    """Initialize a game object. Its url and description are added to <texts>, and its feature
+    masks are given by <vocabulary>.
+    """
+    return game_from_record(parse_row(row), texts, vocabulary)
+
+
+def parse_row(row: list) -> tuple:
+    """Return the record of the game in the given tidy row of the original csv: a tuple of its
+    url, id, name, popular tags, game details, genres, description, mature content keywords,
+    price, popularity score and genre mask.
+
+    The features are lists in the order they are listed in the row (for mature content, the
+    order of mature_keywords), so that game_from_record builds the same sets, iterated in the
+    same order, as init_game_obj, even in another process.
     """
     url = row[0]
     id_num = get_id_num(url)
     name = row[2]
-    popular_tags = set(row[9].split(','))
-    game_details = set(row[10].split(','))
-    genre = set(row[13].split(','))
-    game_description = row[14]
+    popular_tags = row[9].split(',')
+    game_details = row[10].split(',')
+    genre = row[13].split(',')
 
     if row[15] not in {'NaN', ''}:
-        mature_content = get_mature_content(row[15])
+        mature_content = mature_keywords(row[15])
     else:
-        mature_content = set()
+        mature_content = []
 
     price = 0.0
     if '$' in row[18]:
@@ -262,11 +851,26 @@ def init_game_obj(row: list) -> Game:
 
     all_reviews = get_all_reviews(row[5])
     popularity_score = all_reviews[1] * all_reviews[0] / 100
-    genre_bools = get_genre_bools(game_details, genre)
+    genre_mask = pack_genre_bools(get_genre_bools(set(game_details), set(genre)))
 
-    game = Game(url, id_num, name, popular_tags, game_details, genre, game_description,
-                mature_content, price, popularity_score, genre_bools, 0.0)
-    return game
+    return (url, id_num, name, popular_tags, game_details, genre, row[14], mature_content, price,
+            popularity_score, genre_mask)
+
+
+def game_from_record(record: tuple, texts: ListTextStore, vocabulary: FeatureVocabulary) -> Game:
+    """Return the game of the given record (see parse_row). Its url and description are added to
+    <texts>, and its feature masks are given by <vocabulary>.
+
+    The feature sets are not shared through <vocabulary>: an equal set built from features in
+    another order can be iterated in another order, which would change the final csv.
+    """
+    url, id_num, name, popular_tags, game_details, genre, game_description, mature_content, \
+        price, popularity_score, genre_mask = record
+    mature_content = frozenset(set(mature_content)) if mature_content != [] else frozenset()
+    feature_sets = (frozenset(popular_tags), frozenset(game_details), frozenset(genre),
+                    mature_content)
+    return Game(id_num, name, *feature_sets, price, popularity_score, genre_mask,
+                vocabulary.masks(feature_sets), texts, texts.add((url, game_description)), 0.0)
 
 
 def get_id_num(url: str) -> str:
@@ -274,63 +878,67 @@ def get_id_num(url: str) -> str:
 
     Preconditions:
         - the url must contain the id.
-    """
-    id_num, digit = '', False
-    for i in range(0, len(url)):
-        if url[i].isdigit():
-            digit = True
-            id_num += url[i]
-        elif url[i] == '/' and digit is True:
-            break
 
-    return id_num
+    >>> get_id_num('https://store.steampowered.com/app/379720/DOOM/')
+    '379720'
+    """
+    return ID_PATTERN.search(url).group()
 
 
 def get_all_reviews(info: str) -> tuple[int, int]:
     """Get review information from the given string.
 
-    Return the percentage of positive reviews and the total number of reviews.
+    Return the percentage of positive reviews and the total number of reviews, or (0, 0) if the
+    string does not contain them.
 
     Preconditions:
         - '%' in info
-    """
-    index = info.index('%')
-    percentage = int(info[index - 2:index])
-    total_players = 0
-    for i in range(index + 9, index + 16):
-        if info[i] == ' ':
-            break
-        elif info[i].isdigit():
-            total_players *= 10
-            total_players += int(info[i])
 
-    return (percentage, total_players)
+    >>> get_all_reviews('Mixed,(836,608),- 49% of the 836,608 user reviews for this game are '
+    ...                 'positive.')
+    (49, 836608)
+    >>> get_all_reviews('Positive,(12),- 100% of the 12 user reviews for this game are positive.')
+    (100, 12)
+    >>> get_all_reviews('Mixed,(20),- 5% of the 20 user reviews for this game are positive.')
+    (5, 20)
+    >>> get_all_reviews('Very Positive,(1,234,567),- 91% of the 1,234,567 user reviews for this '
+    ...                 'game are positive.')
+    (91, 1234567)
+    """
+    # the percentage has at most 3 digits, so the search can start right before the first '%'
+    match = REVIEWS_PATTERN.search(info, max(info.find('%') - 3, 0))
+    if match is None:
+        return (0, 0)
+    return (int(match.group(1)), int(match.group(2).replace(',', '')))
 
 
 def get_mature_content(description: str) -> set[str]:
     """Return a set of keywords from the given description of mature content.
 
+    Preconditions:
+        - description not in {'NaN', ''}:
+
+    >>> sorted(get_mature_content(' Mature Content Description  The developers describe the '
+    ...                           'content like this:  Frequent Violence and Gore, Nudity.'))
+    ['sex', 'violence']
+    """
+    return set(mature_keywords(description))
+
+
+def mature_keywords(description: str) -> list[str]:
+    """Return the keywords of get_mature_content, in the order they first appear in the given
+    description.
+
     Preconditions:
         - description not in {'NaN', ''}:
     """
-    set_so_far = set()
-    lst = description.split()
-    for i in range(10, len(lst)):
-        word = lst[i].lower().strip('-,;.!\"\'')
-        if word in VIOLENCE_KEYWORDS:
-            set_so_far.add('violence')
-        elif word in ADDICTION_KEYWORDS:
-            set_so_far.add('addiction')
-        elif word in HORROR_KEYWORDS:
-            set_so_far.add('horror')
-        elif word in SEX_KEYWORDS:
-            set_so_far.add('sex')
-        elif word in GENERAL_KEYWORDS:
-            set_so_far.add('general')
-
-    if set_so_far == set():
-        set_so_far.add('other')
-    return set_so_far
+    categories = (MATURE_CATEGORIES.get(word.lower().strip('-,;.!\"\''))
+                  for word in description.split()[MATURE_CONTENT_PREAMBLE:])
+    keywords = list(dict.fromkeys(category for category in categories if category is not None))
+
+    if keywords == []:
+        keywords.append('other')
+    return keywords
 
 
 def get_genre_bools(game_details: set[str], genre: set[str]) -> list[bool]:
@@ -345,25 +953,14 @@ def get_genre_bools(game_details: set[str], genre: set[str]) -> list[bool]:
     7. indie
     8. sports
     9. single-player
+
+    >>> get_genre_bools({'Single-player'}, {'Racing', 'Indie'})
+    [False, False, False, False, False, False, True, True, True]
     """
     lst_so_far = [False for _ in range(9)]
     for word in genre:
-        if word == 'Action':
-            lst_so_far[0] = True
-        elif word == 'Adventure':
-            lst_so_far[1] = True
-        elif word == 'Strategy':
-            lst_so_far[2] = True
-        elif word == 'RPG':
-            lst_so_far[3] = True
-        elif word == 'Simulation':
-            lst_so_far[4] = True
-        elif word == 'Casual':
-            lst_so_far[5] = True
-        elif word == 'Indie':
-            lst_so_far[6] = True
-        elif word in {'Racing', 'Sports'}:
-            lst_so_far[7] = True
+        if word in GENRE_QUESTIONS:
+            lst_so_far[GENRE_QUESTIONS[word]] = True
 
     if 'Single-player' in game_details:
         lst_so_far[8] = True
@@ -374,30 +971,32 @@ def get_genre_bools(game_details: set[str], genre: set[str]) -> list[bool]:
 def compute_similarity(game1: Game, game2: Game) -> float:
     """Compute the similarity score between the two given games.
 
-    The similarity score is based on popular_tags, game_details, genre, and mature_content.
+    The similarity score is based on popular_tags, game_details, genre, and mature_content,
+    which are compared through their bitmasks (see FeatureVocabulary): the size of the
+    intersection or union of two sets is the number of bits set in the AND or OR of their masks.
 
     Preconditions:
         - game1 is not game2
+        - game1 and game2 were built with the same FeatureVocabulary
     """
-    if game1.popular_tags != set() and game2.popular_tags != set():
-        w1 = len(game1.popular_tags.intersection(game2.popular_tags)) / len(
-            game1.popular_tags.union(game2.popular_tags))
+    masks1, masks2 = game1.feature_masks, game2.feature_masks
+    if masks1[0] != 0 and masks2[0] != 0:
+        w1 = bin(masks1[0] & masks2[0]).count('1') / bin(masks1[0] | masks2[0]).count('1')
     else:
         w1 = 0.0
 
-    if game1.game_details != set() and game2.game_details != set():
-        w2 = len(game1.game_details.intersection(game2.game_details)) / len(
-            game1.game_details.union(game2.game_details))
+    if masks1[1] != 0 and masks2[1] != 0:
+        w2 = bin(masks1[1] & masks2[1]).count('1') / bin(masks1[1] | masks2[1]).count('1')
     else:
         w2 = 0.0
 
-    if game1.genre != set() and game2.genre != set():
-        w3 = len(game1.genre.intersection(game2.genre)) / len(game1.genre.union(game2.genre))
+    if masks1[2] != 0 and masks2[2] != 0:
+        w3 = bin(masks1[2] & masks2[2]).count('1') / bin(masks1[2] | masks2[2]).count('1')
     else:
         w3 = 0.0
 
-    if game1.mature_content != set() and game2.mature_content != set():
-        w4 = max(0.5, len(game1.mature_content.intersection(game2.mature_content)))
+    if masks1[3] != 0 and masks2[3] != 0:
+        w4 = max(0.5, bin(masks1[3] & masks2[3]).count('1'))
     else:
         w4 = 0.0
 
@@ -415,9 +1014,13 @@ if __name__ == '__main__':
     python_ta.contracts.DEBUG_CONTRACTS = False
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['python_ta.contracts', 'csv', 'urllib.request', 'json', 'random',
-                          'weighted_decision'],
-        'allowed-io': ['load_games', 'filter_original_csv', 'read_filtered_csv', 'write_csv'],
+        'extra-imports': ['python_ta.contracts', 'collections.abc', 'concurrent.futures', 'csv',
+                          'functools', 'heapq', 'io', 'time', 'typing', 'urllib.request', 'json',
+                          're', 'catalogue',
+                          'similarity_engine', 'weighted_decision'],
+        'allowed-io': ['load_games_csv', 'filter_original_csv', 'read_filtered_csv',
+                       'write_csv', 'read_tidy_games', 'CsvTextStore._read', 'update_catalogue',
+                       'read_final_csv', 'parse_tidy_rows'],
         'max-line-length': 100,
         'disable': ['R1702']
     })
@@ -0,0 +1,70 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module measures the CPU time used by main_loop while the window is idle, with the
+SDL dummy video driver, so that it runs without a display.
+
+Usage: python idle_benchmark.py [final_csv] [--seconds S] [--fps N]
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+import argparse
+import os
+import threading
+import time
+import pygame
+from recommendation_engine import EngineLoader
+from recommendation_system import main_loop, FPS
+
+
+def measure_idle(loader: EngineLoader, seconds: float = 10, fps: int = FPS) -> float:
+    """Return the CPU seconds used per second by main_loop while it shows the main page for
+    <seconds> seconds, without any input.
+
+    The time main_loop takes to open the window and draw the first page is included, so
+    <seconds> should be long compared to it. So is the time the loader takes to load the
+    catalogue, unless it has already been waited for.
+
+    Preconditions:
+        - seconds > 0
+        - fps > 0
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    timer = threading.Timer(seconds, pygame.event.post, (pygame.event.Event(pygame.QUIT),))
+    start, start_cpu = time.perf_counter(), time.process_time()
+    timer.start()
+    main_loop(loader, fps=fps)
+
+    return (time.process_time() - start_cpu) / (time.perf_counter() - start)
+
+
+def parse_args(args: list[str] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments of the benchmark."""
+    parser = argparse.ArgumentParser(description='Measure the CPU time used by the window while '
+                                                 'it is idle.')
+    parser.add_argument('catalogue_name', nargs='?', default='data/final_games.csv')
+    parser.add_argument('--seconds', type=float, default=10, metavar='S',
+                        help='how long the window stays idle')
+    parser.add_argument('--fps', type=int, default=FPS, metavar='N',
+                        help='the frame cap of main_loop')
+    return parser.parse_args(args)
+
+
+def run(args: list[str] = None) -> None:
+    """Run the benchmark with the given command line arguments and print the result."""
+    options = parse_args(args)
+    loader = EngineLoader(options.catalogue_name)
+    loader.wait()
+    cpu = measure_idle(loader, options.seconds, options.fps)
+    print(f'{cpu * 1000:.1f} ms of CPU time per idle second')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,311 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module contains a persistent cache of the Steam libraries returned by
+read_json_data, so that looking up the same Steam ID again does not wait for the Steam API.
+
+The libraries are stored in an SQLite file, keyed by Steam ID, along with the time they were
+fetched and the time they were last used. An entry is fresh for <ttl> seconds. After that, it is
+still returned for <stale_ttl> more seconds while it is fetched again in a background thread
+(stale-while-revalidate); older entries are fetched before returning. When there are more than
+<max_entries> entries, the least recently used ones are removed. If the file cannot be opened,
+open_library_cache returns a cache that stores nothing, so every library is fetched.
+
+Libraries are fetched with fetch_library, which gives up on a request after a timeout and tries
+again with an exponential backoff. LibraryCache.get_in_background reads a library in a background
+thread and returns a LibraryRequest, whose state can be polled by the Pygame loop so that the
+window keeps responding while the Steam API is slow.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+from collections.abc import Iterator
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+import urllib.error
+from data_computations import read_json_data, STEAM_API_URL
+from loading_states import LOADING, LOADED, FAILED
+
+DEFAULT_CACHE_FILE = 'data/library_cache.sqlite3'
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_STALE_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 256
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+
+
+def fetch_library(steam_id: str, base_url: str = STEAM_API_URL, timeout: float = DEFAULT_TIMEOUT,
+                  retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF) -> dict:
+    """Return read_json_data(steam_id, base_url, timeout), trying again up to <retries> times if
+    the request times out, cannot connect, or gets a server error (a 5xx status).
+
+    The k-th retry (starting from 0) waits backoff * 2 ** k seconds first. Other errors, like a
+    4xx status, are raised at once.
+
+    Preconditions:
+        - timeout > 0
+        - retries >= 0
+        - backoff >= 0
+    """
+    for attempt in range(retries + 1):
+        try:
+            return read_json_data(steam_id, base_url, timeout)
+        except urllib.error.HTTPError as error:
+            if error.code < 500 or attempt == retries:
+                raise
+        except OSError:
+            # urllib.error.URLError and timeouts
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+    raise ValueError('retries must be at least 0')
+
+
+class LibraryCache:
+    """A persistent, size-bounded cache of Steam libraries keyed by Steam ID.
+
+    Errors raised by the fetch function (such as urllib.error.HTTPError for an invalid Steam ID)
+    are not cached, and are raised by get when there is no entry that can be returned instead.
+
+    Instance Attributes:
+        - filename: the name of the SQLite file storing the cache, or None if nothing is stored
+          and every library is fetched
+        - ttl: the number of seconds an entry is fresh after it is fetched
+        - stale_ttl: the number of seconds a stale entry can still be returned while it is
+          fetched again in the background
+        - max_entries: the largest number of entries kept
+
+    Representation Invariants:
+        - self.ttl >= 0 and self.stale_ttl >= 0
+        - self.max_entries > 0
+    """
+    filename: str
+    ttl: float
+    stale_ttl: float
+    max_entries: int
+    # Private Instance Attributes:
+    #   - _fetch: the function returning the library of a Steam ID from the Steam API
+    #   - _clock: the function returning the current time, in seconds
+    #   - _lock: held while the set of Steam IDs being refreshed is read or changed
+    #   - _refreshing: the Steam IDs being fetched again in a background thread
+    #   - _threads: the background threads started by this cache
+    _fetch: Callable[[str], dict]
+    _clock: Callable[[], float]
+    _lock: threading.Lock
+    _refreshing: set[str]
+    _threads: list[threading.Thread]
+
+    def __init__(self, filename: Optional[str] = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL,
+                 stale_ttl: float = DEFAULT_STALE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 fetch: Callable[[str], dict] = fetch_library,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.filename = filename
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._fetch = fetch
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._threads = []
+
+        if filename is None:
+            return
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS libraries (steam_id TEXT PRIMARY KEY, '
+                               'data TEXT NOT NULL, fetched_at REAL NOT NULL, '
+                               'used_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS libraries_used_at '
+                               'ON libraries (used_at)')
+
+    def get(self, steam_id: str) -> dict:
+        """Return the library of the given Steam ID, in the format of read_json_data.
+
+        A fresh entry is returned directly. A stale entry is returned directly too, and fetched
+        again in a background thread. Otherwise, the library is fetched before returning.
+        """
+        if self.filename is None:
+            return self._fetch(steam_id)
+
+        now = self._clock()
+        with self._connect() as connection:
+            row = connection.execute('SELECT data, fetched_at FROM libraries WHERE steam_id = ?',
+                                     (steam_id,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl + self.stale_ttl:
+                connection.execute('UPDATE libraries SET used_at = ? WHERE steam_id = ?',
+                                   (now, steam_id))
+                if now - row[1] > self.ttl:
+                    self._refresh_in_background(steam_id)
+                return json.loads(row[0])
+
+        return self.refresh(steam_id)
+
+    def refresh(self, steam_id: str) -> dict:
+        """Fetch the library of the given Steam ID, store it, and return it."""
+        data = self._fetch(steam_id)
+        if self.filename is None:
+            return data
+
+        now = self._clock()
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO libraries VALUES (?, ?, ?, ?)',
+                               (steam_id, json.dumps(data), now, now))
+            connection.execute('DELETE FROM libraries WHERE steam_id NOT IN (SELECT steam_id '
+                               'FROM libraries ORDER BY used_at DESC LIMIT ?)',
+                               (self.max_entries,))
+        return data
+
+    def get_in_background(self, steam_id: str) -> LibraryRequest:
+        """Start reading the library of the given Steam ID with get in a background thread, and
+        return the request, whose state can be polled."""
+        return LibraryRequest(self, steam_id)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for the background refreshes started so far to finish."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def __len__(self) -> int:
+        """Return the number of entries in this cache."""
+        if self.filename is None:
+            return 0
+        with self._connect() as connection:
+            return connection.execute('SELECT COUNT(*) FROM libraries').fetchone()[0]
+
+    def _refresh_in_background(self, steam_id: str) -> None:
+        """Start fetching the library of the given Steam ID in a background thread, unless it is
+        already being fetched."""
+        with self._lock:
+            if steam_id in self._refreshing:
+                return
+            self._refreshing.add(steam_id)
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+        thread = threading.Thread(target=self._background_refresh, args=(steam_id,), daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _background_refresh(self, steam_id: str) -> None:
+        """Fetch the library of the given Steam ID again. If the fetch or the cache file fails,
+        the stale entry is kept."""
+        try:
+            self.refresh(steam_id)
+        except Exception:  # the thread has no caller to raise to
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(steam_id)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the cache file, commit the changes made with it, and close it.
+
+        Each call opens its own connection, since SQLite connections cannot be shared between
+        the main thread and the background threads.
+        """
+        connection = sqlite3.connect(self.filename, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+def open_library_cache(filename: str = DEFAULT_CACHE_FILE) -> LibraryCache:
+    """Return a LibraryCache stored in <filename>, or one that stores nothing if the file cannot
+    be opened, for example because its directory is missing or read-only.
+
+    >>> open_library_cache('missing_directory/library_cache.sqlite3').filename is None
+    True
+    """
+    try:
+        return LibraryCache(filename)
+    except sqlite3.Error:
+        return LibraryCache(None)
+
+
+class LibraryRequest:
+    """A Steam library being read from a LibraryCache in a background thread.
+
+    Instance Attributes:
+        - steam_id: the Steam ID whose library is read
+        - state: LOADING while the library is being read, then LOADED or FAILED
+        - data: the library, once it is loaded
+        - error: the error raised while reading the library, if it failed
+
+    Representation Invariants:
+        - self.state in {LOADING, LOADED, FAILED}
+        - (self.state == LOADED) == (self.data is not None)
+        - (self.state == FAILED) == (self.error is not None)
+    """
+    steam_id: str
+    state: str
+    data: Optional[dict]
+    error: Optional[Exception]
+    # Private Instance Attributes:
+    #   - _thread: the thread reading the library
+    _thread: threading.Thread
+
+    def __init__(self, cache: LibraryCache, steam_id: str) -> None:
+        self.steam_id = steam_id
+        self.state = LOADING
+        self.data = None
+        self.error = None
+        self._thread = threading.Thread(target=self._load, args=(cache,), daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the library to be read, for at most <timeout> seconds if it is not None.
+
+        Return whether the request is done (loaded or failed).
+        """
+        self._thread.join(timeout)
+        return self.state != LOADING
+
+    def _load(self, cache: LibraryCache) -> None:
+        """Read the library from the cache, and record the result or the error.
+
+        The result is stored before the state changes, so that it is there as soon as the state
+        is polled as LOADED. Any error (a network error, malformed JSON, a failing cache file...)
+        makes the request FAILED, so that it never stays LOADING.
+        """
+        try:
+            self.data = cache.get(self.steam_id)
+            self.state = LOADED
+        except Exception as error:  # reported through the state instead of lost in the thread
+            self.error = error
+            self.state = FAILED
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'collections.abc', 'contextlib', 'json',
+                          'sqlite3', 'threading', 'time', 'typing', 'urllib.error',
+                          'data_computations', 'loading_states'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['E1136', 'W0703']
+    })
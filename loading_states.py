@@ -0,0 +1,42 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module contains the states of the work done in a background thread while the
+Pygame window keeps responding, such as a LibraryRequest reading a Steam library or an
+EngineLoader loading the catalogue. The Pygame loop polls the state of each of them.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+# The work is still being done
+LOADING = 'loading'
+
+# The work is done, and its result is stored
+LOADED = 'loaded'
+
+# The work raised an error, which is stored instead of a result
+FAILED = 'failed'
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
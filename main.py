@@ -3,6 +3,11 @@ CSC111 Winter 2021 Project: Video Game Recommendation System
 
 This Python module is the main module where the program is run.
 
+The window opens at once, while the catalogue is loaded in the background.
+
+Usage: python main.py [final_csv] [--render-stats] [--profile-startup]
+       python main.py --check
+
 Copyright and Usage Information
 ===============================
 This file is provided solely for the personal and private use of the CSC111 course department
@@ -12,17 +17,50 @@ copyright for CSC111 project materials, please consult our Course Syllabus.
 
 This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
 """
-from data_computations import load_games
-from recommendation_system import main_loop
+import argparse
+import time
 
 
-def run() -> None:
-    """Run the program"""
-    games, tree, graph = load_games()
-    main_loop((games, tree, graph))
+def parse_args(args: list[str] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments of the program."""
+    parser = argparse.ArgumentParser(description='Recommend Steam games from a questionnaire and '
+                                                 'your Steam library.')
+    parser.add_argument('catalogue_name', nargs='?', default='data/final_games.csv')
+    parser.add_argument('--render-stats', action='store_true',
+                        help='print how the text of each page was rendered')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print the time spent in each phase of the startup')
+    parser.add_argument('--check', action='store_true',
+                        help='run the doctests and python_ta on this module instead of the '
+                             'program')
+    return parser.parse_args(args)
 
 
-if __name__ == '__main__':
+def run(args: list[str] = None) -> None:
+    """Run the program with the given command line arguments."""
+    options = parse_args(args)
+    if options.check:
+        check()
+        return
+
+    start = time.perf_counter()
+    # imported here, so that the time they take is part of the startup profile
+    from data_computations import LoadProgress
+    from recommendation_engine import EngineLoader
+    from recommendation_system import main_loop
+    progress = LoadProgress(start)
+    progress.add_time('imports', time.perf_counter() - start)
+
+    main_loop(EngineLoader(options.catalogue_name, progress), options.render_stats,
+              profile_startup=options.profile_startup)
+
+
+def check() -> None:
+    """Run the doctests and python_ta on this module.
+
+    This is the check the other modules run when they are run directly; here it is behind
+    --check, so that the window opens as soon as the program is started.
+    """
     import doctest
 
     doctest.testmod(verbose=True)
@@ -33,8 +71,14 @@ if __name__ == '__main__':
     python_ta.contracts.DEBUG_CONTRACTS = False
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['python_ta.contracts', 'data_computations', 'recommendation_system'],
+        'extra-imports': ['python_ta.contracts', 'argparse', 'time', 'data_computations',
+                          'recommendation_engine', 'recommendation_system'],
         'allowed-io': [],
         'max-line-length': 100,
-        'disable': [],
+        # run imports the rest of the program itself, to profile the time the imports take
+        'disable': ['C0415'],
     })
+
+
+if __name__ == '__main__':
+    run()
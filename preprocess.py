@@ -0,0 +1,72 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module is the command line entry point of the preprocessing step, which turns the
+original Steam csv into the clean csv read by load_games.
+
+Usage: python preprocess.py [input_csv] [output_csv] [--vectorized]
+                            [--workers N | --chunk-size C [--binary]] [--max-neighbours K]
+       python preprocess.py new_rows_csv final_csv --update [--remove ID ...]
+                            [--max-neighbours K]
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+import argparse
+import csv
+from data_computations import read_csv, update_catalogue
+from streaming import stream_csv
+
+
+def parse_args(args: list[str] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments of the preprocessing step."""
+    parser = argparse.ArgumentParser(description='Build the clean games csv and the similarity '
+                                                 'graph from the original Steam csv.')
+    parser.add_argument('input_name', nargs='?', default='data/sample_original_games.csv')
+    parser.add_argument('output_name', nargs='?', default='data/sample_final_games.csv')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='score the pairs in blocks with NumPy')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--workers', type=int, default=1, metavar='N',
+                       help='number of processes scoring the pairs (implies --vectorized)')
+    group.add_argument('--chunk-size', type=int, default=None, metavar='C',
+                       help='stream the csv in chunks of C games, spilled to disk, to bound '
+                            'the memory used (implies --vectorized)')
+    parser.add_argument('--binary', action='store_true',
+                        help='with --chunk-size, also write the binary catalogue, which loads '
+                             'the whole output once')
+    parser.add_argument('--max-neighbours', type=int, default=None, metavar='K',
+                        help='keep at most K edges per game')
+    parser.add_argument('--update', action='store_true',
+                        help='add or replace the games of input_name in the existing output_name '
+                             'instead of rebuilding it')
+    parser.add_argument('--remove', action='append', default=[], metavar='ID',
+                        help='with --update, remove the game with this id (can be repeated)')
+    return parser.parse_args(args)
+
+
+def run(args: list[str] = None) -> None:
+    """Run the preprocessing step with the given command line arguments."""
+    options = parse_args(args)
+    if options.update:
+        with open(options.input_name, errors='ignore') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)
+            new_rows = list(reader)
+        update_catalogue(options.output_name, new_rows, options.remove, options.max_neighbours)
+    elif options.chunk_size is not None:
+        stream_csv(options.input_name, options.output_name, options.chunk_size,
+                   options.max_neighbours, write_binary=options.binary)
+    else:
+        read_csv(options.input_name, options.output_name, options.vectorized, options.workers,
+                 options.max_neighbours)
+
+
+if __name__ == '__main__':
+    run()
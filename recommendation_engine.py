@@ -0,0 +1,162 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module contains the recommendation engine, which recommends games from a loaded
+catalogue given the answers of a user and their Steam library. It does not depend on Pygame, so
+the recommendations can be computed and benchmarked without a window (see batch.py).
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+import threading
+from typing import Optional
+from data_computations import LoadProgress, load_games, pop_score_computation, \
+    graph_computation, tree_computation, select_top_games
+from loading_states import LOADING, LOADED, FAILED
+from weighted_decision import Game, DecisionTree, CSRGraph
+
+NUM_RESULTS = 9  # number of games recommended, one per row of the results table
+
+
+class RecommendationEngine:
+    """Recommends games from a catalogue returned by load_games.
+
+    The catalogue is never mutated, so one engine can serve any number of users.
+
+    Instance Attributes:
+        - games: a dictionary mapping game ids to the games of the catalogue
+        - tree: the decision tree classifying the games in terms of genre
+        - graph: the weighted graph linking similar games together
+    """
+    games: dict[str, Game]
+    tree: DecisionTree
+    graph: CSRGraph
+
+    def __init__(self, games: dict[str, Game], tree: DecisionTree, graph: CSRGraph) -> None:
+        self.games = games
+        self.tree = tree
+        self.graph = graph
+
+    def recommend(self, answers: list[bool], dont_care: list[int],
+                  owned_games: Optional[dict] = None,
+                  n: int = NUM_RESULTS) -> list[tuple[str, float]]:
+        """Return the ids and recommendation scores of the <n> games recommended to a user, from
+        highest to lowest score.
+
+        answers are the answers of the user to the questions of GENRE_QUESTIONS, and dont_care
+        the indices of the questions the user does not care about (their answers are False).
+        owned_games is the Steam library of the user, in the format returned by read_json_data,
+        or None if the user did not enter a valid Steam ID.
+
+        The games are found in the tree first (tree_computation), then the games similar to the
+        ones the user owns are added and the owned games removed (graph_computation), and the
+        popularity of each game is added to its score (pop_score_computation).
+
+        Preconditions:
+            - len(answers) == NUM_QUESTIONS
+            - all(0 <= i < NUM_QUESTIONS and not answers[i] for i in dont_care)
+            - n >= 0
+        """
+        game_set, scores = set(), {}
+        tree_computation(self.tree, answers, dont_care, game_set, scores, n)
+        if owned_games is not None:
+            graph_computation(self.games, self.graph, owned_games, game_set, scores)
+        pop_score_computation(self.games, list(game_set), scores)
+
+        return [(game, scores[game]) for game in select_top_games(scores, game_set, n)]
+
+
+class EngineLoader:
+    """A catalogue being loaded with load_games in a background thread, so that the window can
+    open while it loads.
+
+    Instance Attributes:
+        - filename: the final games csv the catalogue is loaded from
+        - state: LOADING while the catalogue is being loaded, then LOADED or FAILED
+        - progress: the progress of the loading, updated by the background thread
+        - engine: the engine recommending from the catalogue, once it is loaded
+        - error: the error raised while loading the catalogue, if it failed
+
+    Representation Invariants:
+        - self.state in {LOADING, LOADED, FAILED}
+        - (self.state == LOADED) == (self.engine is not None)
+        - (self.state == FAILED) == (self.error is not None)
+    """
+    filename: str
+    state: str
+    progress: LoadProgress
+    engine: Optional[RecommendationEngine]
+    error: Optional[Exception]
+    # Private Instance Attributes:
+    #   - _thread: the thread loading the catalogue
+    _thread: threading.Thread
+
+    def __init__(self, filename: str = 'data/final_games.csv',
+                 progress: Optional[LoadProgress] = None) -> None:
+        self.filename = filename
+        self.state = LOADING
+        self.progress = LoadProgress() if progress is None else progress
+        self.engine = None
+        self.error = None
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the catalogue to be loaded, for at most <timeout> seconds if it is not None.
+
+        Return whether the loading is done (loaded or failed).
+        """
+        self._thread.join(timeout)
+        return self.state != LOADING
+
+    def _load(self) -> None:
+        """Load the catalogue, and record the engine or the error.
+
+        The engine is stored before the state changes, so that it is there as soon as the state
+        is polled as LOADED. Any error (a missing file, a malformed row...) makes the loading
+        FAILED, so that it never stays LOADING.
+
+        >>> import csv, os, tempfile
+        >>> from data_computations import FINAL_CSV_HEADER
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     filename = os.path.join(directory, 'final_games.csv')
+        ...     with open(filename, 'w', newline='') as file:
+        ...         csv.writer(file).writerows([FINAL_CSV_HEADER, ['1', 'short row']])
+        ...     loader = EngineLoader(filename)
+        ...     loader.wait(10)
+        True
+        >>> (loader.state, type(loader.error).__name__)
+        ('failed', 'IndexError')
+        """
+        try:
+            self.engine = RecommendationEngine(*load_games(self.filename, self.progress))
+            self.state = LOADED
+        except Exception as error:  # reported through the state instead of lost in the thread
+            self.error = error
+            self.state = FAILED
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'threading', 'typing', 'data_computations',
+                          'loading_states', 'weighted_decision'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['E1136', 'W0703']
+    })
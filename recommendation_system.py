@@ -13,15 +13,16 @@ copyright for CSC111 project materials, please consult our Course Syllabus.
 This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
 """
 from __future__ import annotations
+from collections import OrderedDict
+import time
 from typing import Optional
-import random
 import urllib.error
-import webbrowser
 import pygame
 from pygame.colordict import THECOLORS
-from data_computations import pop_score_computation, graph_computation, tree_computation, \
-    read_json_data
-from weighted_decision import Game, DecisionTree, WeightedGraph
+from library_cache import LibraryCache, LibraryRequest, open_library_cache
+from loading_states import LOADING, LOADED, FAILED
+from recommendation_engine import RecommendationEngine, EngineLoader, NUM_RESULTS
+from weighted_decision import Game
 
 SCREEN_SIZE = (800, 800)
 BACKGROUND_TEXT_SIZE = 45
@@ -49,41 +50,101 @@ DESC_ORIGIN = (25, 130)
 WARNIING_POS = (20, 750)
 URL_BUTTON_SIZE = (680, 15)
 URL_POS = (360, 750)
+PROGRESS_POS = (400, 765)  # the center of the loading progress of the catalogue, on the main page
 
 FONT_HEADER = "data/game_font.TTF"
-FONT_BODY = "data/body_font.TTF"
+FONT_BODY = "data/body_font.ttf"
 
+# Number of rendered lines of text kept by the TextRenderer; a page has at most a few hundred
+RENDER_CACHE_SIZE = 1024
 
-def main_loop(system_objects: tuple[dict[str, Game], DecisionTree, WeightedGraph]) -> None:
+FPS = 30  # the most frames drawn per second by main_loop
+
+# Side of the square cells of the grid a ButtonGroup uses to find the sprite under the mouse
+HIT_GRID_SIZE = 50
+
+PAGES = ('main', 'tree', 'graph', 'results', 'desc')
+
+# The static part of the background of each page, rendered once (see page_template)
+_PAGE_TEMPLATES = {}
+
+
+def main_loop(loader: EngineLoader, render_stats: bool = False, fps: int = FPS,
+              profile_startup: bool = False) -> None:
     """The main loop of Pygame.
-    """
-    game_set = set()  # The set of games to recommend
 
+    The window opens while the catalogue is still being loaded by <loader>: the progress of the
+    loading is shown at the bottom of the main page, and the start button only works once the
+    catalogue is loaded.
+
+    The sprites are only drawn again after an event (the mouse moving over a button, a click, a
+    key) or a change of page, and only the rectangles they cover are sent to the display, unless
+    the whole page changed. At most <fps> frames are drawn per second, and the loop sleeps
+    between them.
+
+    If render_stats is True, print how the text of each page was rendered (see
+    TextRenderer.report) whenever the page changes. If profile_startup is True, print the time
+    spent in each phase of the startup (see LoadProgress.report) once the catalogue is loaded.
+
+    Preconditions:
+        - fps > 0
+    """
+    start = time.perf_counter()
     screen = initialize_screen()
+    loader.progress.add_time('pygame init', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    initialize_templates()
     all_groups = initialize_groups()
     initialize_sprites(all_groups)
-    background = initialize_background()
+    background = page_template('main')
     screen.blit(background, (0, 0))
+    loader.progress.add_time('page templates', time.perf_counter() - start)
+    if render_stats:
+        print(TEXT_RENDERER.report('main'))
 
+    engine = None  # the recommendation engine, once the catalogue is loaded
+    progress, progress_rect = None, None  # the progress message shown and where it is drawn
     clicked_sprite, curr_num_box = None, None
+    loading = None  # the OKButton whose steam library is being read in the background
     group, running = 'main', True
+    redraw, full_update = True, True  # whether to draw the sprites and the whole page again
+    clock = pygame.time.Clock()
     while running:
+        if engine is None and loader_message(loader) != progress:
+            # the main page is shown until the catalogue is loaded, so the message is drawn on it
+            progress = loader_message(loader)
+            progress_rect, changed = draw_message(screen, background, progress, progress_rect)
+            pygame.display.update(changed)
+            if loader.state == LOADED:
+                engine = loader.engine
+                if profile_startup:
+                    print(loader.progress.report())
+
         for event in pygame.event.get():
+            redraw = True
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                full_update = True
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 # Check what is being clicked (before the user releases the mouse!)
-                for sprite in all_groups[group]:
-                    if sprite.rect.collidepoint(pygame.mouse.get_pos()):  # check if touching mouse
-                        clicked_sprite = sprite
+                sprite = all_groups[group].sprite_at(pygame.mouse.get_pos())
+                if sprite is not None:
+                    clicked_sprite = sprite
             elif event.type == pygame.MOUSEBUTTONUP and event.dict['button'] == 1 \
                     and clicked_sprite is not None and isinstance(clicked_sprite, Button) \
-                    and clicked_sprite.rect.collidepoint(pygame.mouse.get_pos()):
+                    and clicked_sprite.rect.collidepoint(pygame.mouse.get_pos()) \
+                    and (engine is not None or not isinstance(clicked_sprite, StartButton)):
                 # Call sprite.clicked() after the user releases the left button of the mouse
-                output = mouse_click(clicked_sprite, system_objects, game_set)
+                output = mouse_click(clicked_sprite)
                 if output[0] is not None:
                     group, background, curr_num_box = output
                     screen.blit(background, (0, 0))
+                    full_update = True
+                    loading = clicked_sprite if isinstance(clicked_sprite, OKButton) else None
+                    if render_stats:
+                        print(TEXT_RENDERER.report(group))
                 clicked_sprite = None
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
@@ -91,10 +152,24 @@ def main_loop(system_objects: tuple[dict[str, Game], DecisionTree, WeightedGraph
                 elif group == 'graph':
                     curr_num_box = keyboard_entry(event, curr_num_box)
 
-        all_groups[group].clear(screen, background)
-        all_groups[group].update()
-        all_groups[group].draw(screen)
-        pygame.display.update()
+        if loading is not None and loading.poll(engine):
+            # the results are ready, so the table is filled in
+            background = loading.background
+            screen.blit(background, (0, 0))
+            redraw, full_update, loading = True, True, None
+            if render_stats:
+                print(TEXT_RENDERER.report('results (filled in)'))
+
+        if redraw:
+            all_groups[group].clear(screen, background)
+            all_groups[group].update()
+            dirty_rects = all_groups[group].draw(screen)
+            if full_update:
+                pygame.display.update()
+            else:
+                pygame.display.update(dirty_rects)
+            redraw, full_update = False, False
+        clock.tick(fps)
 
     pygame.display.quit()
     pygame.quit()
@@ -115,6 +190,10 @@ class Button(pygame.sprite.Sprite):
     image: pygame.Surface
     rect: pygame.Rect
     text: str
+    # Private Instance Attributes:
+    #   - _drawn: whether the mouse was on top, the default color and the text when the image
+    #     was last drawn
+    _drawn: tuple[bool, tuple, str]
 
     def __init__(self, colors: tuple[tuple, tuple], center: tuple[int, int], button_text: str,
                  size: tuple[int, int] = BUTTON_SIZE) -> None:
@@ -127,11 +206,20 @@ class Button(pygame.sprite.Sprite):
         self.rect.center = center
         self.text = button_text
         center_text(self.image, button_text, BUTTON_TEXT_SIZE, THECOLORS['black'])
+        self._drawn = (False, self.color1, self.text)
 
     def update(self) -> None:
         """Update the color of this button when mouse is hovering/not hovering on top.
+
+        The image is only drawn again if the mouse moved on top of the button or away from it,
+        or if the default color or the text changed, since it was last drawn.
         """
-        if self.rect.collidepoint(pygame.mouse.get_pos()):
+        hovered = bool(self.rect.collidepoint(pygame.mouse.get_pos()))
+        if (hovered, self.color1, self.text) == self._drawn:
+            return
+        self._drawn = (hovered, self.color1, self.text)
+
+        if hovered:
             self.image.fill(self.color2)
             center_text(self.image, self.text, BUTTON_TEXT_SIZE + 2, THECOLORS['black'])
         else:
@@ -149,46 +237,9 @@ class StartButton(Button):
     """
 
     def clicked(self) -> tuple[str, pygame.Surface]:
-        """Initialize the second page (Q & A with decision tree).
-
-        Draw a big table of 9 rows (each representing a question) and 4 columns
-        (first column is questions, the rest are 'Yes', 'Don't care', 'No thanks').
+        """Go to the second page (Q & A with decision tree).
         """
-        new_background = pygame.Surface(SCREEN_SIZE)
-        new_background.fill(COLOURS['navy'])
-        my_text = text('Please check the boxes to indicate your preferences of genre',
-                       BACKGROUND_TEXT_SIZE - 15, COLOURS['light_blue'], FONT_BODY)
-        my_text2 = text("For more accurate recommendations, try avoid selecting 'I don't care",
-                        BACKGROUND_TEXT_SIZE - 20, COLOURS['light_blue'], FONT_BODY)
-        text_rect = my_text.get_rect(center=BACKGROUND_TEXT_POS)
-        text2_rect = my_text.get_rect(center=(460, 150))
-
-        new_background.blit(my_text, text_rect)
-        new_background.blit(my_text2, text2_rect)
-
-        table_section = pygame.Surface(TABLE_SIZE)
-        bol_lst = ['', 'YES', 'DON\'T CARE', 'NO']
-        genre_lst = ['ACTION', 'ADVENTURE', 'STRATEGY', 'RPG', 'SIMULATION', 'CASUAL', 'INDIE',
-                     'SPORTS', 'SINGLE-PLAYER']
-
-        # the first row (including the top-left corner)
-        for i in range(len(bol_lst)):
-            table_cell(table_section, (COLUMN_WIDTH, ROW_LENGTH),
-                       (i * (COLUMN_WIDTH + BOUNDARIES_WIDTH), 0), bol_lst[i])
-
-        # the rest of the rows
-        for i in range(1, 10):
-            for j in range(4):
-                pos = (j * (COLUMN_WIDTH + BOUNDARIES_WIDTH), i * (ROW_LENGTH + BOUNDARIES_WIDTH))
-                if j == 0:
-                    table_text = genre_lst[i - 1]
-                else:
-                    table_text = ''
-                table_cell(table_section, (COLUMN_WIDTH, ROW_LENGTH), pos, table_text)
-
-        new_background.blit(table_section, TABLE_ORIGIN)
-
-        return ('tree', new_background)
+        return ('tree', page_template('tree'))
 
 
 class NextButton(Button):
@@ -207,44 +258,17 @@ class NextButton(Button):
         self.num_boxes = num_boxes
 
     def clicked(self) -> tuple[str, pygame.Surface]:
-        """Initialize the third page (steam account).
-        """
-        new_background = pygame.Surface(SCREEN_SIZE)
-        new_background.fill(COLOURS['navy'])
-        my_text = text('Please enter your Steam ID', BACKGROUND_TEXT_SIZE,
-                       COLOURS['light_blue'], FONT_HEADER)
-        text_rect = my_text.get_rect(center=BACKGROUND_TEXT_POS)
-        new_background.blit(my_text, text_rect)
-
-        msg = ['Your Steam ID is a sequence of 17 numbers unique to each Steam user',
-               'To find your Steam ID:',
-               '1. Log into your Steam Account',
-               '2. Click on the username in the top right corner => "View Profile"',
-               '3. Your Steam ID should be at the very top, shown in a link',
-               'e.g. if the link is http://steamcommunity.com/profiles/12345678987654321',
-               'the steam id will be: 12345678987654321']
-        curr_pos = 260
-        for i in range(0, len(msg)):
-            body_text = text(msg[i], 20, COLOURS['light_blue'], FONT_BODY)
-            body_rect = body_text.get_rect(center=(SCREEN_SIZE[0] // 2, curr_pos))
-            new_background.blit(body_text, body_rect)
-            curr_pos += 30
-
-        return ('graph', new_background)
-
-    def get_games(self, game_set: set[str],
-                  system_objects: tuple[dict[str, Game], DecisionTree, WeightedGraph]) -> None:
-        """Add new games to game_set based on user answers and the tree.
+        """Go to the third page (steam account).
         """
-        answers, indices = self._get_answers()
-        games, tree = system_objects[0], system_objects[1]
-        tree_computation(games, tree, answers, indices, game_set)
+        return ('graph', page_template('graph'))
 
-    def _get_answers(self) -> tuple[list[bool], list[int]]:
+    def get_answers(self) -> tuple[list[bool], list[int]]:
         """Return a list of booleans representing the user's answers and
          a list of indices where the answer could change.
 
-        If the user didn't select an answer or selected 'I don't care', select a random answer.
+        If the user didn't select an answer or selected 'I don't care', the answer is False and
+        its index is added to the list, so that the recommendation engine treats it as a free
+        answer.
         """
         answers, indices, index = [], [], 0
         for question in self.small_buttons:
@@ -253,7 +277,7 @@ class NextButton(Button):
             elif question[2].selected is True:
                 answers.append(False)
             else:
-                answers.append(random.choice([True, False]))
+                answers.append(False)
                 indices.append(index)
             index += 1
 
@@ -294,95 +318,102 @@ class OKButton(Button):
     Instance Attributes:
         - num_boxes: a list of NumBoxes on this page
         - background: the background for the next page (results)
-        - table: the table for the next page (results)
         - user_data: output from API
         - valid_steam_id: a boolean indicating whether the user has entered a valid steam id
         - read_buttons: a list of ReadButtons on the next page
         - back_button: the BackButton for the description stage (which stores the same background)
+        - next_button: the NextButton of the Q & A page, which has the answers of the user
+        - library_cache: the cache the steam libraries are read from
+        - request: the steam library being read in the background, or None if there is none
     """
     num_boxes: list[NumBox]
     background: pygame.Surface
-    table: pygame.Surface
     user_data: dict
     valid_steam_id: bool
     read_buttons: list[ReadButton]
     back_button: BackButton
+    next_button: NextButton
+    library_cache: LibraryCache
+    request: Optional[LibraryRequest]
 
     def __init__(self, num_boxes: list[NumBox], read_buttons: list[ReadButton],
-                 back_button: BackButton) -> None:
+                 back_button: BackButton, next_button: NextButton,
+                 library_cache: LibraryCache) -> None:
         Button.__init__(self, STANDARD_BUTTON_COLORS, BUTTON_POS, 'OK')
         self.num_boxes = num_boxes
         self.background = pygame.Surface(SCREEN_SIZE)
-        self.table = pygame.Surface(TABLE_SIZE)
         self.user_data = {}
         self.valid_steam_id = False
         self.read_buttons = read_buttons
         self.back_button = back_button
+        self.next_button = next_button
+        self.library_cache = library_cache
+        self.request = None
 
     def clicked(self) -> tuple[str, pygame.Surface]:
-        """Initialize the third page (steam account) if there is nothing wrong with user id.
-        """
-        self.background.fill(COLOURS['navy'])
+        """Initialize the results page, and start reading the steam library of the user in the
+        background.
 
-        try:
-            self.user_data = read_json_data(self._get_id())
-            self.valid_steam_id = True
-        except urllib.error.HTTPError:
-            my_text = text('You did not enter a valid Steam ID. '
-                           'The results are based on the Q & A session only.',
-                           TABLE_TEXT_SIZE, COLOURS['yellow'], FONT_BODY)
-            self.background.blit(my_text, WARNIING_POS)
+        The table is empty until the library is read (see poll).
+        """
+        self.request = self.library_cache.get_in_background(self._get_id())
+        self._draw_page('Loading your Steam library...')
 
-        my_text = text('Here are the top 9 games recommended for you!', BACKGROUND_TEXT_SIZE - 10,
-                       COLOURS['light_blue'], FONT_HEADER)
-        text_rect = my_text.get_rect(center=BACKGROUND_TEXT_POS)
-        self.background.blit(my_text, text_rect)
+        return ('results', self.background)
 
-        col_lst = ['NAME', 'GENRE', 'PRICE (USD)', 'DESCRIPTION']  # info to display for each game
+    def poll(self, engine: RecommendationEngine) -> bool:
+        """If the steam library of the user has been read, fill in the results page with the
+        games the engine recommends and return True. Otherwise, return False.
 
-        # column names (including the top-left corner):
-        for i in range(len(col_lst)):
-            table_cell(self.table, (COLUMN_WIDTH, ROW_LENGTH),
-                       (i * (COLUMN_WIDTH + BOUNDARIES_WIDTH), 0), col_lst[i])
+        If the library could not be read, the results are based on the Q & A session only.
+        """
+        if self.request is None or self.request.state == LOADING:
+            return False
 
-        self.background.blit(self.table, TABLE_ORIGIN)
+        request, self.request = self.request, None
+        self.valid_steam_id = request.state == LOADED
+        if self.valid_steam_id:
+            self.user_data = request.data
+            self._draw_page('')
+        elif isinstance(request.error, urllib.error.HTTPError) and request.error.code < 500:
+            self._draw_page('You did not enter a valid Steam ID. '
+                            'The results are based on the Q & A session only.')
+        else:
+            self._draw_page('Steam could not be reached. '
+                            'The results are based on the Q & A session only.')
 
-        return ('results', self.background)
+        answers, dont_care = self.next_button.get_answers()
+        owned_games = self.user_data if self.valid_steam_id else None
+        recommendations = engine.recommend(answers, dont_care, owned_games, NUM_RESULTS)
+        self.show_games([engine.games[game] for game, _ in recommendations])
+        return True
 
-    def get_games(self, game_set: set[str],
-                  system_objects: tuple[dict[str, Game], DecisionTree, WeightedGraph]) -> None:
-        """Add new games to game_set based on user's steam id and the graph.
+    def _draw_page(self, message: str) -> None:
+        """Draw the results page without any game, with the given message, on self.background.
+        """
+        self.background.blit(page_template('results'), (0, 0))
+        my_text = text(message, TABLE_TEXT_SIZE, COLOURS['yellow'], FONT_BODY)
+        self.background.blit(my_text, WARNIING_POS)
 
-        Eliminate the games that the user already played in their steam account.
+    def show_games(self, selected_games: list[Game]) -> None:
+        """Display the given games in the results table, from the first row down.
 
-        Mutate self.read_buttons and self.back_button so that they have the descriptions, urls,
+        Mutate self.read_buttons and self.back_button so that they have the games to describe
         and the background.
         """
-        games, graph = system_objects[0], system_objects[2]
-        if self.valid_steam_id:
-            graph_computation(games, graph, self.user_data, game_set)
-
-        game_lst = list(game_set)
-        pop_score_computation(games, game_lst)
-        # sort the games in terms of recommendation score, keep the top 9
-        selected_games = sorted(game_lst, key=lambda game: games[game].recommendation_score,
-                                reverse=True)[:9]
-
-        # mutate self.table, display game info
-        for i in range(9):
-            content_lst = [games[selected_games[i]].name,
-                           str(games[selected_games[i]].genre)[1:-1].replace('\'', ''),
-                           str(games[selected_games[i]].price), '']
-            self.read_buttons[i].desc = games[selected_games[i]].game_description
-            self.read_buttons[i].url = games[selected_games[i]].url
+        # display game info; the column names are already in the template of the page
+        table = self.background.subsurface(pygame.Rect(TABLE_ORIGIN, TABLE_SIZE))
+        for i in range(len(selected_games)):
+            content_lst = [selected_games[i].name, ', '.join(selected_games[i].genre),
+                           str(selected_games[i].price), '']
+            self.read_buttons[i].game = selected_games[i]
 
             for j in range(4):
                 table_text = content_lst[j]
                 pos = (j * (COLUMN_WIDTH + BOUNDARIES_WIDTH),
                        (i + 1) * (ROW_LENGTH + BOUNDARIES_WIDTH))
-                table_cell(self.table, (COLUMN_WIDTH, ROW_LENGTH), pos, table_text)
+                table_cell(table, (COLUMN_WIDTH, ROW_LENGTH), pos, table_text)
 
-        self.background.blit(self.table, TABLE_ORIGIN)
         self.back_button.background = self.background
 
     def _get_id(self) -> str:
@@ -424,35 +455,32 @@ class ReadButton(Button):
     the user.
 
     Instance Attributes:
-        - desc: a description for the game
-        - url: a string representing the steam website of the game
+        - game: the game to describe, or None before the results are computed
         - url_button: a URL button that can be clicked on
     """
-    desc: str
-    url: str
+    game: Optional[Game]
     url_button: UrlButton
 
     def __init__(self, center: tuple[int, int], url_button: UrlButton) -> None:
         Button.__init__(self, (COLOURS['yellow'], THECOLORS['grey']), center, 'Read')
-        self.desc = ''
-        self.url = ''
+        self.game = None
         self.url_button = url_button
 
-    def clicked(self) -> tuple[str, pygame.Surface]:
+    def clicked(self) -> Optional[tuple[str, pygame.Surface]]:
         """Displays description and url.
+
+        The description is only read from the catalogue here, when it is shown. Do nothing if
+        the results are still loading.
         """
-        new_background = pygame.Surface(SCREEN_SIZE)
-        new_background.fill(COLOURS['light_blue'])
-        desc_title = text('Game Description', BACKGROUND_TEXT_SIZE + 10,
-                          COLOURS['navy'], FONT_HEADER)
-        desc_text_rect = desc_title.get_rect(center=BACKGROUND_TEXT_POS)
-        new_background.blit(desc_title, desc_text_rect)
-        self.url_button.text = self.url
-
-        desc_background = pygame.Surface(DESC_SIZE)
-        desc_background.fill(COLOURS['navy'])
-        center_paragraph(desc_background, self.desc, TABLE_TEXT_SIZE, THECOLORS['white'])
-        new_background.blit(desc_background, DESC_ORIGIN)
+        if self.game is None:
+            return None
+
+        new_background = page_template('desc').copy()
+        self.url_button.text = self.game.url
+
+        desc_background = new_background.subsurface(pygame.Rect(DESC_ORIGIN, DESC_SIZE))
+        center_paragraph(desc_background, self.game.game_description, TABLE_TEXT_SIZE,
+                         THECOLORS['white'])
 
         return ('desc', new_background)
 
@@ -466,6 +494,10 @@ class UrlButton(Button):
         - rect: the rectangle of this button's image (surface), stored as pygame.Rect
         - text: the text on the button
     """
+    # Private Instance Attributes:
+    #   - _drawn: whether the mouse was on top and the text when the image was last drawn, or
+    #     None if it was never drawn
+    _drawn: Optional[tuple[bool, str]]
 
     def __init__(self) -> None:
         pygame.sprite.Sprite.__init__(self)
@@ -475,11 +507,20 @@ class UrlButton(Button):
         self.rect = self.image.get_rect()
         self.rect.center = URL_POS
         self.text = ''
+        self._drawn = None
 
     def update(self) -> None:
         """Update the color of this button when mouse is hovering/not hovering on top.
+
+        The image is only drawn again if the mouse moved on top of the button or away from it,
+        or if the url changed, since it was last drawn.
         """
-        if self.rect.collidepoint(pygame.mouse.get_pos()):
+        hovered = bool(self.rect.collidepoint(pygame.mouse.get_pos()))
+        if (hovered, self.text) == self._drawn:
+            return
+        self._drawn = (hovered, self.text)
+
+        if hovered:
             self.image.fill(self.color)
             center_text(self.image, 'Game url: ' + self.text, TABLE_TEXT_SIZE, COLOURS['url_blue'])
         else:
@@ -489,6 +530,8 @@ class UrlButton(Button):
     def clicked(self) -> None:
         """Open the webpage.
         """
+        import webbrowser  # only imported when a webpage is opened
+
         webbrowser.open(self.text)
 
 
@@ -502,19 +545,18 @@ class RestartButton(Button):
     Instance Attributes:
         - all_groups: a dict mapping stage names to sprite groups.
     """
-    all_groups: dict[str, pygame.sprite.Group]
+    all_groups: dict[str, ButtonGroup]
 
-    def __init__(self, all_groups: dict[str, pygame.sprite.Group]) -> None:
+    def __init__(self, all_groups: dict[str, ButtonGroup]) -> None:
         Button.__init__(self, STANDARD_BUTTON_COLORS, BUTTON_POS, 'Restart', RESTART_BUTTON_SIZE)
         self.all_groups = all_groups
 
     def clicked(self) -> tuple[str, pygame.Surface]:
         """Restart the system.
         """
-        background = initialize_background()
         initialize_sprites(self.all_groups)
 
-        return ('main', background)
+        return ('main', page_template('main'))
 
 
 class BackButton(Button):
@@ -539,11 +581,73 @@ class BackButton(Button):
         return ('results', self.background)
 
 
+class ButtonGroup(pygame.sprite.RenderUpdates):
+    """A group of sprites that do not move, which finds the sprite under the mouse without
+    checking every sprite.
+
+    When a sprite is added, it is listed in every cell of a grid of HIT_GRID_SIZE pixels that
+    its rect overlaps, so only the few sprites of the cell under the mouse are checked.
+
+    Sample Usage:
+    >>> group = ButtonGroup()
+    >>> sprite = pygame.sprite.Sprite()
+    >>> sprite.rect = pygame.Rect(40, 40, 20, 20)
+    >>> group.add(sprite)
+    >>> group.sprite_at((55, 45)) is sprite
+    True
+    >>> group.sprite_at((65, 45)) is None
+    True
+    """
+    # Private Instance Attributes:
+    #   - _grid: maps each cell (column, row) of the grid to the sprites whose rect overlaps it,
+    #     in the order they were added
+    _grid: dict[tuple[int, int], list[pygame.sprite.Sprite]]
+
+    def __init__(self) -> None:
+        self._grid = {}
+        pygame.sprite.RenderUpdates.__init__(self)
+
+    def add_internal(self, sprite: pygame.sprite.Sprite, layer: Optional[int] = None) -> None:
+        """Add the sprite to this group and to the cells of the grid it overlaps."""
+        pygame.sprite.RenderUpdates.add_internal(self, sprite, layer)
+        for cell in _grid_cells(sprite.rect):
+            self._grid.setdefault(cell, []).append(sprite)
+
+    def remove_internal(self, sprite: pygame.sprite.Sprite) -> None:
+        """Remove the sprite from this group and from the cells of the grid it overlaps."""
+        pygame.sprite.RenderUpdates.remove_internal(self, sprite)
+        for cell in _grid_cells(sprite.rect):
+            self._grid[cell].remove(sprite)
+
+    def sprite_at(self, pos: tuple[int, int]) -> Optional[pygame.sprite.Sprite]:
+        """Return the sprite whose rect contains pos, or None if there is none.
+
+        If several sprites contain pos, return the one added last, which is drawn on top.
+        """
+        cell = (pos[0] // HIT_GRID_SIZE, pos[1] // HIT_GRID_SIZE)
+        for sprite in reversed(self._grid.get(cell, [])):
+            if sprite.rect.collidepoint(pos):
+                return sprite
+        return None
+
+
+def _grid_cells(rect: pygame.Rect) -> list[tuple[int, int]]:
+    """Return the cells of the grid of a ButtonGroup that the given rect overlaps.
+
+    >>> _grid_cells(pygame.Rect(40, 40, 20, 20))
+    [(0, 0), (0, 1), (1, 0), (1, 1)]
+    """
+    return [(column, row)
+            for column in range(rect.left // HIT_GRID_SIZE, (rect.right - 1) // HIT_GRID_SIZE + 1)
+            for row in range(rect.top // HIT_GRID_SIZE, (rect.bottom - 1) // HIT_GRID_SIZE + 1)]
+
+
 def initialize_screen() -> pygame.Surface:
     """Initialize pygame and the display window.
     """
     pygame.display.init()
     pygame.font.init()
+    TEXT_RENDERER.clear()  # fonts loaded before pygame.font.init cannot be used any more
     screen = pygame.display.set_mode(SCREEN_SIZE)
     screen.fill(COLOURS['light_blue'])
     pygame.display.flip()
@@ -552,22 +656,23 @@ def initialize_screen() -> pygame.Surface:
     return screen
 
 
-def initialize_groups() -> dict[str, pygame.sprite.Group]:
+def initialize_groups() -> dict[str, ButtonGroup]:
     """Initialize sprite groups and return a dictionary mapping the four stages to their groups.
 
-    They can be treated as lists of sprite objects.
+    They can be treated as lists of sprite objects. The groups are ButtonGroups, whose draw
+    method returns the rectangles of the screen it changed.
     """
-    main_group = pygame.sprite.Group()
-    tree_group = pygame.sprite.Group()
-    graph_group = pygame.sprite.Group()
-    results_group = pygame.sprite.Group()
-    desc_group = pygame.sprite.Group()
+    main_group = ButtonGroup()
+    tree_group = ButtonGroup()
+    graph_group = ButtonGroup()
+    results_group = ButtonGroup()
+    desc_group = ButtonGroup()
 
     return {'main': main_group, 'tree': tree_group, 'graph': graph_group, 'results': results_group,
             'desc': desc_group}
 
 
-def initialize_sprites(all_groups: dict[str, pygame.sprite.Group]) -> None:
+def initialize_sprites(all_groups: dict[str, ButtonGroup]) -> None:
     """Initialize all sprites, add them to groups.
     """
     for group in all_groups:
@@ -589,7 +694,8 @@ def initialize_sprites(all_groups: dict[str, pygame.sprite.Group]) -> None:
     back_button = BackButton()
     back_button.add(all_groups['desc'])
 
-    ok_button = OKButton(num_boxes, read_buttons, back_button)
+    ok_button = OKButton(num_boxes, read_buttons, back_button, next_button,
+                         open_library_cache())
     ok_button.add(all_groups['graph'])
 
     restart_button = RestartButton(all_groups)
@@ -627,7 +733,141 @@ def initialize_background() -> pygame.Surface:
     return background
 
 
-def _init_small_buttons(all_groups: dict[str, pygame.sprite.Group]) -> list[list[SmallButton]]:
+def page_template(page: str) -> pygame.Surface:
+    """Return the static part of the background of the given page, rendering it the first time
+    it is needed.
+
+    The templates are shared, so they must be copied before anything is drawn on them.
+
+    Preconditions:
+        - page in PAGES
+    """
+    if page not in _PAGE_TEMPLATES:
+        renderers = {'main': initialize_background, 'tree': _tree_template,
+                     'graph': _graph_template, 'results': _results_template,
+                     'desc': _desc_template}
+        _PAGE_TEMPLATES[page] = renderers[page]()
+    return _PAGE_TEMPLATES[page]
+
+
+def initialize_templates() -> None:
+    """Render the static part of the background of every page, so that changing page does not
+    render them again.
+    """
+    _PAGE_TEMPLATES.clear()
+    for page in PAGES:
+        page_template(page)
+
+
+def _tree_template() -> pygame.Surface:
+    """Render the background of the second page (Q & A with decision tree).
+
+    Draw a big table of 9 rows (each representing a question) and 4 columns
+    (first column is questions, the rest are 'Yes', 'Don't care', 'No thanks').
+    """
+    new_background = pygame.Surface(SCREEN_SIZE)
+    new_background.fill(COLOURS['navy'])
+    my_text = text('Please check the boxes to indicate your preferences of genre',
+                   BACKGROUND_TEXT_SIZE - 15, COLOURS['light_blue'], FONT_BODY)
+    my_text2 = text("For more accurate recommendations, try avoid selecting 'I don't care",
+                    BACKGROUND_TEXT_SIZE - 20, COLOURS['light_blue'], FONT_BODY)
+    text_rect = my_text.get_rect(center=BACKGROUND_TEXT_POS)
+    text2_rect = my_text.get_rect(center=(460, 150))
+
+    new_background.blit(my_text, text_rect)
+    new_background.blit(my_text2, text2_rect)
+
+    table_section = pygame.Surface(TABLE_SIZE)
+    bol_lst = ['', 'YES', 'DON\'T CARE', 'NO']
+    genre_lst = ['ACTION', 'ADVENTURE', 'STRATEGY', 'RPG', 'SIMULATION', 'CASUAL', 'INDIE',
+                 'SPORTS', 'SINGLE-PLAYER']
+
+    # the first row (including the top-left corner)
+    for i in range(len(bol_lst)):
+        table_cell(table_section, (COLUMN_WIDTH, ROW_LENGTH),
+                   (i * (COLUMN_WIDTH + BOUNDARIES_WIDTH), 0), bol_lst[i])
+
+    # the rest of the rows
+    for i in range(1, 10):
+        for j in range(4):
+            pos = (j * (COLUMN_WIDTH + BOUNDARIES_WIDTH), i * (ROW_LENGTH + BOUNDARIES_WIDTH))
+            if j == 0:
+                table_text = genre_lst[i - 1]
+            else:
+                table_text = ''
+            table_cell(table_section, (COLUMN_WIDTH, ROW_LENGTH), pos, table_text)
+
+    new_background.blit(table_section, TABLE_ORIGIN)
+
+    return new_background
+
+
+def _graph_template() -> pygame.Surface:
+    """Render the background of the third page (steam account).
+    """
+    new_background = pygame.Surface(SCREEN_SIZE)
+    new_background.fill(COLOURS['navy'])
+    my_text = text('Please enter your Steam ID', BACKGROUND_TEXT_SIZE,
+                   COLOURS['light_blue'], FONT_HEADER)
+    text_rect = my_text.get_rect(center=BACKGROUND_TEXT_POS)
+    new_background.blit(my_text, text_rect)
+
+    msg = ['Your Steam ID is a sequence of 17 numbers unique to each Steam user',
+           'To find your Steam ID:',
+           '1. Log into your Steam Account',
+           '2. Click on the username in the top right corner => "View Profile"',
+           '3. Your Steam ID should be at the very top, shown in a link',
+           'e.g. if the link is http://steamcommunity.com/profiles/12345678987654321',
+           'the steam id will be: 12345678987654321']
+    curr_pos = 260
+    for i in range(0, len(msg)):
+        body_text = text(msg[i], 20, COLOURS['light_blue'], FONT_BODY)
+        body_rect = body_text.get_rect(center=(SCREEN_SIZE[0] // 2, curr_pos))
+        new_background.blit(body_text, body_rect)
+        curr_pos += 30
+
+    return new_background
+
+
+def _results_template() -> pygame.Surface:
+    """Render the background of the results page, with the column names of the table and no
+    game.
+    """
+    new_background = pygame.Surface(SCREEN_SIZE)
+    new_background.fill(COLOURS['navy'])
+    my_text = text(f'Here are the top {NUM_RESULTS} games recommended for you!',
+                   BACKGROUND_TEXT_SIZE - 10, COLOURS['light_blue'], FONT_HEADER)
+    text_rect = my_text.get_rect(center=BACKGROUND_TEXT_POS)
+    new_background.blit(my_text, text_rect)
+
+    table = pygame.Surface(TABLE_SIZE)
+    col_lst = ['NAME', 'GENRE', 'PRICE (USD)', 'DESCRIPTION']  # info to display for each game
+
+    # column names (including the top-left corner):
+    for i in range(len(col_lst)):
+        table_cell(table, (COLUMN_WIDTH, ROW_LENGTH),
+                   (i * (COLUMN_WIDTH + BOUNDARIES_WIDTH), 0), col_lst[i])
+
+    new_background.blit(table, TABLE_ORIGIN)
+
+    return new_background
+
+
+def _desc_template() -> pygame.Surface:
+    """Render the background of the description page, without any description.
+    """
+    new_background = pygame.Surface(SCREEN_SIZE)
+    new_background.fill(COLOURS['light_blue'])
+    desc_title = text('Game Description', BACKGROUND_TEXT_SIZE + 10,
+                      COLOURS['navy'], FONT_HEADER)
+    desc_text_rect = desc_title.get_rect(center=BACKGROUND_TEXT_POS)
+    new_background.blit(desc_title, desc_text_rect)
+    new_background.fill(COLOURS['navy'], pygame.Rect(DESC_ORIGIN, DESC_SIZE))
+
+    return new_background
+
+
+def _init_small_buttons(all_groups: dict[str, ButtonGroup]) -> list[list[SmallButton]]:
     """Initialize small buttons.
     """
     small_buttons = [[] for _ in range(9)]
@@ -644,7 +884,7 @@ def _init_small_buttons(all_groups: dict[str, pygame.sprite.Group]) -> list[list
     return small_buttons
 
 
-def _init_num_boxes(all_groups: dict[str, pygame.sprite.Group]) -> list[NumBox]:
+def _init_num_boxes(all_groups: dict[str, ButtonGroup]) -> list[NumBox]:
     """Initialize num boxes.
     """
     num_boxes = []
@@ -662,12 +902,12 @@ def _init_num_boxes(all_groups: dict[str, pygame.sprite.Group]) -> list[NumBox]:
     return num_boxes
 
 
-def _init_read_buttons(all_groups: dict[str, pygame.sprite.Group],
+def _init_read_buttons(all_groups: dict[str, ButtonGroup],
                        url_button: UrlButton) -> list[ReadButton]:
     """Initialize read buttons.
     """
     read_buttons = []
-    for i in range(9):
+    for i in range(NUM_RESULTS):
         x = TABLE_ORIGIN[0] + COLUMN_WIDTH // 2 + 3 * COLUMN_WIDTH + 3 * BOUNDARIES_WIDTH
         y = TABLE_ORIGIN[1] + ROW_LENGTH // 2 + (i + 1) * (ROW_LENGTH + BOUNDARIES_WIDTH)
         read_button = (ReadButton((x, y), url_button))
@@ -677,12 +917,15 @@ def _init_read_buttons(all_groups: dict[str, pygame.sprite.Group],
     return read_buttons
 
 
-def mouse_click(clicked_sprite: Button, system_objects: tuple, game_set: set[str]) -> \
+def mouse_click(clicked_sprite: Button) -> \
         tuple[Optional[str], Optional[pygame.Surface], Optional[NumBox]]:
     """Deal with a user mouseclick.
 
     Return the new group and background (if any); also return the current NumBox to be filled
     with input text.
+
+    The results of an OKButton are only shown once its steam library is read (see
+    OKButton.poll).
     """
     group, background, curr_num_box = None, None, None
     output = clicked_sprite.clicked()
@@ -690,12 +933,7 @@ def mouse_click(clicked_sprite: Button, system_objects: tuple, game_set: set[str
         # Switch to another page and background
         group, background = output
         if isinstance(clicked_sprite, NextButton):
-            clicked_sprite.get_games(game_set, system_objects)
             curr_num_box = clicked_sprite.num_boxes[0]
-        elif isinstance(clicked_sprite, OKButton):
-            clicked_sprite.get_games(game_set, system_objects)
-        elif isinstance(clicked_sprite, RestartButton):
-            reset_recommendation_scores(system_objects[0])
 
     return (group, background, curr_num_box)
 
@@ -722,12 +960,44 @@ def keyboard_entry(event: pygame.event.Event, curr_num_box: NumBox) -> NumBox:
 
 def table_cell(table: pygame.Surface, dim: tuple[int, int],
                pos: tuple[int, int], table_text: str) -> None:
-    """Blit one cell with the given dimensions, position, and text onto the table.
+    """Draw one cell with the given dimensions, position, and text onto the table.
+
+    The cell is drawn in place, through a subsurface of the table, instead of on a new surface.
+
+    Preconditions:
+        - the cell is inside the table
     """
-    cell = pygame.Surface(dim)
-    cell.fill(COLOURS['light_blue'])
+    table.fill(COLOURS['light_blue'], pygame.Rect(pos, dim))
+    cell = table.subsurface(pygame.Rect(pos, dim))
     center_text(cell, table_text, TABLE_TEXT_SIZE, COLOURS['navy'], True)
-    table.blit(cell, pos)
+
+
+def loader_message(loader: EngineLoader) -> str:
+    """Return the message telling the user how the loading of the catalogue is going, or an
+    empty string once it is loaded.
+    """
+    if loader.state == LOADING:
+        return f'Loading the catalogue... {int(loader.progress.fraction * 100)}%'
+    elif loader.state == FAILED:
+        return f'The catalogue could not be loaded: {loader.error}'
+    else:
+        return ''
+
+
+def draw_message(screen: pygame.Surface, background: pygame.Surface, message: str,
+                 previous: Optional[pygame.Rect]) -> tuple[pygame.Rect, pygame.Rect]:
+    """Draw the message centered at PROGRESS_POS on the screen, erasing the message drawn on
+    the previous rectangle with the background first.
+
+    Return the rectangle of the new message and the rectangle of the screen that changed.
+    """
+    changed = pygame.Rect(PROGRESS_POS, (0, 0)) if previous is None else previous.copy()
+    screen.blit(background, changed, changed)
+
+    my_text = text(message, BUTTON_TEXT_SIZE, COLOURS['light_blue'], FONT_BODY)
+    text_rect = my_text.get_rect(center=PROGRESS_POS)
+    screen.blit(my_text, text_rect)
+    return (text_rect, changed.union(text_rect))
 
 
 def center_text(surface: pygame.surface, message: str, size: int, color: tuple,
@@ -770,16 +1040,81 @@ def center_paragraph(surface: pygame.surface, message: str, size: int, color: tu
 
 def text(message: str, size: int, color: tuple, font: str) -> pygame.Surface:
     """Render a line of text in Pygame.
+
+    The surface returned may be shared with other calls, so it must not be drawn on.
     """
-    my_text = pygame.font.Font(font, size).render(message, True, color)
-    return my_text
+    return TEXT_RENDERER.render(message, size, color, font)
 
 
-def reset_recommendation_scores(games: dict[str, Game]) -> None:
-    """Reset the recommendation scores of all games.
+class TextRenderer:
+    """Renders lines of text in Pygame, keeping one Font per font file and size and the
+    RENDER_CACHE_SIZE lines rendered last.
+
+    Loading a font reads and parses its file, so it is only done once. The same lines are drawn
+    again and again (the text of each button on every frame, the table cells on every page), so
+    most lines are not rendered again either.
+
+    Instance Attributes:
+        - hits: the number of lines found in the cache since the last report
+        - misses: the number of lines rendered since the last report
+        - font_loads: the number of fonts loaded since the last report
+        - render_time: the number of seconds spent in render since the last report
     """
-    for game in games:
-        games[game].recommendation_score = 0.0
+    hits: int
+    misses: int
+    font_loads: int
+    render_time: float
+    # Private Instance Attributes:
+    #   - _fonts: the fonts loaded, by (font file, size)
+    #   - _surfaces: the lines rendered last, by (message, size, color, font file), from least
+    #     to most recently used
+    _fonts: dict[tuple[str, int], pygame.font.Font]
+    _surfaces: OrderedDict[tuple[str, int, tuple, str], pygame.Surface]
+
+    def __init__(self) -> None:
+        self.hits, self.misses, self.font_loads, self.render_time = 0, 0, 0, 0.0
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+
+    def render(self, message: str, size: int, color: tuple, font: str) -> pygame.Surface:
+        """Return the given line of text rendered with the given font file, size and color."""
+        start = time.perf_counter()
+        key = (message, size, tuple(color), font)
+        if key in self._surfaces:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+        else:
+            self.misses += 1
+            self._surfaces[key] = self._font(font, size).render(message, True, color)
+            if len(self._surfaces) > RENDER_CACHE_SIZE:
+                self._surfaces.popitem(last=False)
+        self.render_time += time.perf_counter() - start
+        return self._surfaces[key]
+
+    def clear(self) -> None:
+        """Forget every font and line in this renderer."""
+        self._fonts.clear()
+        self._surfaces.clear()
+
+    def report(self, page: str) -> str:
+        """Return a summary of the rendering done since the last report, for the given page, and
+        start counting again.
+        """
+        lines = self.hits + self.misses
+        summary = (f'{page}: {lines} lines of text, {self.hits / max(lines, 1):.0%} cached, '
+                   f'{self.font_loads} fonts loaded, {self.render_time * 1000:.1f} ms rendering')
+        self.hits, self.misses, self.font_loads, self.render_time = 0, 0, 0, 0.0
+        return summary
+
+    def _font(self, font: str, size: int) -> pygame.font.Font:
+        """Return the font with the given file and size, loading it if needed."""
+        if (font, size) not in self._fonts:
+            self.font_loads += 1
+            self._fonts[(font, size)] = pygame.font.Font(font, size)
+        return self._fonts[(font, size)]
+
+
+TEXT_RENDERER = TextRenderer()
 
 
 if __name__ == '__main__':
@@ -793,9 +1128,10 @@ if __name__ == '__main__':
     python_ta.contracts.DEBUG_CONTRACTS = False
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['python_ta.contracts', 'typing', 'random', 'urllib.error', 'webbrowser',
-                          'pygame', 'pygame.colordict', 'data_computations', 'weighted_decision'],
-        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 'collections', 'time', 'typing', 'urllib.error',
+                          'webbrowser', 'pygame', 'pygame.colordict', 'library_cache',
+                          'loading_states', 'recommendation_engine', 'weighted_decision'],
+        'allowed-io': ['main_loop'],
         'max-line-length': 100,
         'disable': ['R1702', 'E1136'],
         'generated-members': ['pygame.*']
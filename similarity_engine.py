@@ -0,0 +1,320 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module contains a vectorized version of compute_similarity that scores a whole block
+of games at once with NumPy.
+
+The features of the games are stored as bit sets, 64 features per word, so that a catalogue
+takes 1 bit per game and feature, and the number of features two games share is the number of
+bits set in the AND of their words.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+import numpy as np
+from weighted_decision import Game, WeightedGraph, BoundedGraphBuilder, FEATURE_ATTRIBUTES
+
+# Number of rows scored at once by build_graph
+BLOCK_SIZE = 128
+
+# Number of features stored in each word of a bit set
+WORD_SIZE = 64
+
+# The number of bits set in each byte, used by _popcount when NumPy has no np.bitwise_count
+_BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+# The encoded features shared by all the shards scored in a worker process, set once per
+# worker by _init_worker so that they are not sent again with every shard
+_WORKER_STATE = {}
+
+
+@dataclass
+class EncodedFeatures:
+    """The features of a list of games, encoded as bit sets.
+
+    Instance Attributes:
+        - ids: the game ids, in the order of the rows of every array
+        - bits: one array of words per attribute in FEATURE_ATTRIBUTES; the feature f of that
+          attribute is bit f % WORD_SIZE of bits[k][i, f // WORD_SIZE] for the game ids[i]
+        - sizes: sizes[k][i] is the number of features game ids[i] has for attribute k
+        - positions: positions[i] is the position of game ids[i] in the catalogue, which orders
+          the pairs found for each row (see similar_pairs)
+
+    Representation Invariants:
+        - len(self.bits) == len(self.sizes) == len(FEATURE_ATTRIBUTES)
+        - all(b.shape[0] == len(self.ids) and b.dtype == np.uint64 for b in self.bits)
+        - len(self.positions) == len(self.ids)
+    """
+    ids: list[str]
+    bits: list[np.ndarray]
+    sizes: list[np.ndarray]
+    positions: np.ndarray
+
+    def select(self, rows: range) -> EncodedFeatures:
+        """Return the features of the games in the given range of rows, without copying the
+        arrays."""
+        return EncodedFeatures(self.ids[rows.start:rows.stop],
+                               [bits[rows.start:rows.stop] for bits in self.bits],
+                               [sizes[rows.start:rows.stop] for sizes in self.sizes],
+                               self.positions[rows.start:rows.stop])
+
+    def take(self, rows: list[int]) -> EncodedFeatures:
+        """Return the features of the games at the given rows, in that order."""
+        return EncodedFeatures([self.ids[i] for i in rows],
+                               [bits[rows] for bits in self.bits],
+                               [sizes[rows] for sizes in self.sizes],
+                               self.positions[rows])
+
+
+def encode_games(games: list[Game], positions: Optional[list[int]] = None) -> EncodedFeatures:
+    """Return the encoded features of the given games.
+
+    positions are the positions of the games in the catalogue; by default, the games are in
+    catalogue order.
+
+    >>> from weighted_decision import ListTextStore
+    >>> game = Game('1', '', frozenset({'Funny', 'Co-op'}), frozenset({'Stats'}),
+    ...             frozenset({'Indie'}), frozenset(), 0.0, 0.0, 0, (3, 1, 1, 0), ListTextStore(),
+    ...             0, 0.0)
+    >>> features = encode_games([game])
+    >>> [b.shape for b in features.bits]
+    [(1, 1), (1, 1), (1, 1), (1, 0)]
+    >>> [int(b[0, 0]) for b in features.bits[:3]]
+    [3, 1, 1]
+    """
+    bits, sizes = [], []
+    for attr in FEATURE_ATTRIBUTES:
+        vocabulary, indptr, indices = {}, [0], []
+        for game in games:
+            for feature in getattr(game, attr):
+                indices.append(vocabulary.setdefault(feature, len(vocabulary)))
+            indptr.append(len(indices))
+
+        indptr = np.array(indptr, dtype=np.int64)
+        bits.append(pack_features(indptr, np.array(indices, dtype=np.int64), len(vocabulary)))
+        sizes.append(np.diff(indptr).astype(np.float64))
+
+    positions = range(len(games)) if positions is None else positions
+    return EncodedFeatures([game.id_num for game in games], bits, sizes,
+                           np.array(positions, dtype=np.int64))
+
+
+def pack_features(indptr: np.ndarray, indices: np.ndarray, num_features: int) -> np.ndarray:
+    """Return the bit sets of the rows of a CSR incidence matrix: the features of row i are
+    indices[indptr[i]:indptr[i + 1]], out of num_features features.
+
+    >>> pack_features(np.array([0, 2, 3]), np.array([0, 65, 1]), 66).tolist()
+    [[1, 2], [2, 0]]
+    """
+    bits = np.zeros((len(indptr) - 1, -(-num_features // WORD_SIZE)), dtype=np.uint64)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    np.bitwise_or.at(bits, (rows, indices // WORD_SIZE),
+                     np.left_shift(np.uint64(1), (indices % WORD_SIZE).astype(np.uint64)))
+    return bits
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Return the number of bits set in each of the given words."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    counts = _BYTE_COUNTS[words.view(np.uint8)]
+    return counts.reshape(words.shape + (words.itemsize,)).sum(axis=-1, dtype=np.uint8)
+
+
+def score_block(features: EncodedFeatures, rows: range, columns: range) -> np.ndarray:
+    """Return the matrix of similarity scores between the games in <rows> and <columns>.
+
+    The scores are exactly the floats compute_similarity returns for each pair, including the
+    max(0.5, ...) rule for mature content. The score of a game with itself is not meaningful.
+    """
+    return score_features(features.select(rows), features.select(columns))
+
+
+def score_features(rows: EncodedFeatures, columns: EncodedFeatures) -> np.ndarray:
+    """Return the matrix of similarity scores between the games of <rows> and the games of
+    <columns>, as score_block does.
+
+    Preconditions:
+        - all(rows.bits[k].shape[1] == columns.bits[k].shape[1]
+              for k in range(len(FEATURE_ATTRIBUTES)))
+    """
+    scores = np.zeros((len(rows.ids), len(columns.ids)), dtype=np.float64)
+    for k in range(len(FEATURE_ATTRIBUTES)):
+        # one word at a time, so that the memory used is that of the scores
+        shared = np.zeros((len(rows.ids), len(columns.ids)), dtype=np.float64)
+        for word in range(rows.bits[k].shape[1]):
+            shared += _popcount(rows.bits[k][:, word, np.newaxis]
+                                & columns.bits[k][np.newaxis, :, word])
+        size1 = rows.sizes[k][:, np.newaxis]
+        size2 = columns.sizes[k][np.newaxis, :]
+        both_non_empty = (size1 > 0) & (size2 > 0)
+
+        if FEATURE_ATTRIBUTES[k] == 'mature_content':
+            term = np.where(both_non_empty, np.maximum(0.5, shared), 0.0)
+        else:
+            union = size1 + size2 - shared
+            term = np.divide(shared, union, out=np.zeros_like(shared), where=both_non_empty)
+        scores += term
+
+    return scores
+
+
+def similar_pairs(features: EncodedFeatures, rows: range,
+                  threshold: float = 2) -> list[tuple[int, int, float]]:
+    """Return every pair (i, j, weight) with i < j and j in <rows> whose similarity score is
+    above <threshold>.
+
+    The pairs are sorted by j first and then by the position of game i in the catalogue, which
+    is the order read_csv would add them to the graph.
+    """
+    scores = score_block(features, rows, range(0, rows.stop))
+    # only keep the scores against the games that come before each row
+    scores[np.arange(rows.stop)[np.newaxis, :] >= np.array(rows)[:, np.newaxis]] = 0.0
+    js, i_s = np.nonzero(scores > threshold)
+    order = np.lexsort((features.positions[i_s], js))
+
+    return [(int(i_s[k]), int(js[k]) + rows.start, float(scores[js[k], i_s[k]]))
+            for k in order]
+
+
+def row_pairs(features: EncodedFeatures, rows: list[int],
+              threshold: float = 2) -> list[tuple[int, int, float]]:
+    """Return every pair (i, j, weight) with i in <rows> and j != i whose similarity score is
+    above <threshold>, scoring BLOCK_SIZE rows at a time.
+
+    A pair of two games in <rows> is returned twice, once in each order.
+    """
+    pairs = []
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        scores = score_features(features.take(block), features)
+        scores[np.arange(len(block)), block] = 0.0
+        i_s, js = np.nonzero(scores > threshold)
+        pairs.extend((block[i_s[k]], int(js[k]), float(scores[i_s[k], js[k]]))
+                     for k in range(len(i_s)))
+    return pairs
+
+
+def build_graph(games: dict[str, Game], block_size: int = BLOCK_SIZE, workers: int = 1,
+                max_neighbours: Optional[int] = None,
+                order: Optional[list[str]] = None) -> WeightedGraph:
+    """Return the similarity graph of the given games, linking every pair of games whose
+    similarity score is above 2.
+
+    This is a drop-in replacement for the compute_similarity loop in read_csv, and gives the
+    same vertices, edges, weights, and neighbour order. order is the order read_csv compares
+    the games in, which is the order their last rows were read (see read_tidy_games); by
+    default, the order of <games>.
+
+    The pairs are scored in shards of <block_size> rows. If workers > 1, the shards are scored in
+    that many processes; the partial edge lists are merged in shard order, so the graph is the
+    same whatever the number of workers.
+
+    If max_neighbours is not None, only the edges among the max_neighbours heaviest edges of
+    both of their endpoints are kept (see BoundedGraphBuilder).
+
+    Preconditions:
+        - block_size > 0
+        - workers > 0
+        - max_neighbours is None or max_neighbours > 0
+        - order is None or sorted(order) == sorted(games)
+
+    >>> from data_computations import compute_similarity, read_tidy_games
+    >>> sample = read_tidy_games('data/sample_original_games.csv')
+    >>> graph = build_graph(sample)
+    >>> all(graph.get_neighbours(game) == {other: compute_similarity(sample[game], sample[other])
+    ...                                    for other in sample if other != game
+    ...                                    and compute_similarity(sample[game], sample[other]) > 2}
+    ...     for game in sample)
+    True
+
+    With a game id repeated in the csv, the games and the neighbour lists are the same as the
+    ones read_csv writes:
+
+    >>> import csv, os, tempfile
+    >>> from data_computations import read_csv
+    >>> with open('data/sample_original_games.csv', errors='ignore') as file:
+    ...     rows = list(csv.reader(file))
+    >>> repeated = rows[2][:9] + [rows[9][9]] + rows[2][10:]  # the same game with other tags
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     original = os.path.join(directory, 'original.csv')
+    ...     with open(original, 'w', newline='') as file:
+    ...         csv.writer(file).writerows(rows[:30] + [repeated])
+    ...     expected, actual = os.path.join(directory, 'a.csv'), os.path.join(directory, 'b.csv')
+    ...     read_csv(original, expected)
+    ...     read_csv(original, actual, vectorized=True)
+    ...     open(expected, 'rb').read() == open(actual, 'rb').read()
+    True
+    """
+    ids = list(games) if order is None else order
+    positions = {id_num: position for position, id_num in enumerate(games)}
+    features = encode_games([games[id_num] for id_num in ids], [positions[i] for i in ids])
+    graph = WeightedGraph() if max_neighbours is None else BoundedGraphBuilder(max_neighbours)
+    for id_num in games:
+        graph.add_vertex(id_num)
+
+    shards = [range(start, min(start + block_size, len(features.ids)))
+              for start in range(0, len(features.ids), block_size)]
+    for pairs in score_shards(features, shards, workers):
+        for i, j, weight in pairs:
+            graph.add_edge(features.ids[i], features.ids[j], weight)
+
+    return graph if max_neighbours is None else graph.build()
+
+
+def score_shards(features: EncodedFeatures, shards: list[range],
+                 workers: int = 1) -> Iterable[list[tuple[int, int, float]]]:
+    """Return the result of similar_pairs for each shard of rows, in the order of <shards>.
+
+    If workers > 1, the shards are scored by a pool of that many processes. Each worker
+    receives the encoded features once when it starts, and only the row ranges afterwards.
+
+    Preconditions:
+        - workers > 0
+    """
+    if workers == 1:
+        return (similar_pairs(features, rows) for rows in shards)
+
+    # later shards compare against more columns, so they are handed out one at a time
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(features,)) as executor:
+        return list(executor.map(_score_shard, shards))
+
+
+def _init_worker(features: EncodedFeatures) -> None:
+    """Store the encoded features for the shards scored in this worker process."""
+    _WORKER_STATE['features'] = features
+
+
+def _score_shard(rows: range) -> list[tuple[int, int, float]]:
+    """Return similar_pairs for the given shard, using the features of this worker process."""
+    return similar_pairs(_WORKER_STATE['features'], rows)
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'concurrent.futures', 'dataclasses', 'typing',
+                          'numpy', 'weighted_decision'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
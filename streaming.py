@@ -0,0 +1,389 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module contains a streaming version of read_csv for catalogues too large to hold in
+memory at once.
+
+The original csv is read in chunks of tidy games. The csv columns and the encoded features of
+each chunk are spilled to a temporary directory, then every chunk of rows is scored against
+every chunk of columns, and the neighbour lists of a chunk are written to the output as soon as
+they are complete. Only a few chunks, the game ids, their positions and the feature
+vocabularies are in memory at any time, so the peak memory depends on the chunk size rather
+than on the catalogue size.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+import bisect
+from collections.abc import Iterator
+import csv
+import os
+import tempfile
+from typing import Optional
+import numpy as np
+from data_computations import check_tidiness, init_game_obj, get_id_num, game_columns, \
+    neighbour_columns, write_binary_catalogue, FINAL_CSV_HEADER
+from similarity_engine import EncodedFeatures, score_features, pack_features
+from weighted_decision import Game, FeatureVocabulary, ListTextStore, FEATURE_ATTRIBUTES
+
+# Default number of games in a chunk
+CHUNK_SIZE = 512
+
+
+class SpilledCatalogue:
+    """The tidy games of the original csv, spilled to a directory one chunk at a time.
+
+    Each chunk is stored as a csv of its game_columns and a .npz file of its features, in which
+    every attribute is a CSR matrix over the vocabulary of that attribute.
+
+    The games are spilled in the order read_csv compares them, which is the order their last
+    rows were read. This is also the order of the output, unless a game id is repeated: a game
+    is written at the position of its first row.
+
+    Instance Attributes:
+        - directory: the directory the chunks are written to
+        - ids: the ids of all the spilled games, in the order they were spilled
+        - positions: positions[i] is the position of the game ids[i] in the output
+        - chunk_starts: the index of the first game of each chunk, followed by len(self.ids)
+
+    Representation Invariants:
+        - len(self.positions) == len(self.ids)
+        - self.chunk_starts[0] == 0 and self.chunk_starts[-1] == len(self.ids)
+    """
+    directory: str
+    ids: list[str]
+    positions: list[int]
+    chunk_starts: list[int]
+    # Private Instance Attributes:
+    #   - _vocabularies: maps each feature of each attribute in FEATURE_ATTRIBUTES to its column
+    _vocabularies: list[dict[str, int]]
+
+    def __init__(self, directory: str) -> None:
+        """Initialize an empty catalogue spilled to <directory>."""
+        self.directory = directory
+        self.ids = []
+        self.positions = []
+        self.chunk_starts = [0]
+        self._vocabularies = [{} for _ in FEATURE_ATTRIBUTES]
+
+    def num_chunks(self) -> int:
+        """Return the number of chunks spilled so far."""
+        return len(self.chunk_starts) - 1
+
+    def add_chunk(self, games: list[Game], positions: list[int]) -> None:
+        """Spill the given chunk of games, whose positions in the output are <positions>.
+
+        Preconditions:
+            - games != []
+            - len(positions) == len(games)
+        """
+        chunk = self.num_chunks()
+        with open(self._path(chunk, 'csv'), 'w', newline='') as file:
+            writer = csv.writer(file)
+            for game in games:
+                writer.writerow(game_columns(game))
+
+        arrays = {}
+        for k in range(len(FEATURE_ATTRIBUTES)):
+            indptr, indices = [0], []
+            for game in games:
+                for feature in getattr(game, FEATURE_ATTRIBUTES[k]):
+                    indices.append(self._vocabularies[k].setdefault(feature,
+                                                                    len(self._vocabularies[k])))
+                indptr.append(len(indices))
+            arrays[f'indptr{k}'] = np.array(indptr, dtype=np.int64)
+            arrays[f'indices{k}'] = np.array(indices, dtype=np.int64)
+        np.savez(self._path(chunk, 'npz'), **arrays)
+
+        self.ids.extend(game.id_num for game in games)
+        self.positions.extend(positions)
+        self.chunk_starts.append(len(self.ids))
+
+    def chunk_of(self, i: int) -> int:
+        """Return the chunk of the i-th spilled game.
+
+        Preconditions:
+            - 0 <= i < len(self.ids)
+        """
+        return bisect.bisect_right(self.chunk_starts, i) - 1
+
+    def features(self, chunk: int) -> EncodedFeatures:
+        """Return the encoded features of the given chunk, over the full vocabularies.
+
+        Preconditions:
+            - 0 <= chunk < self.num_chunks()
+        """
+        start, stop = self.chunk_starts[chunk], self.chunk_starts[chunk + 1]
+        bits, sizes = [], []
+        with np.load(self._path(chunk, 'npz')) as arrays:
+            for k in range(len(FEATURE_ATTRIBUTES)):
+                indptr, indices = arrays[f'indptr{k}'], arrays[f'indices{k}']
+                bits.append(pack_features(indptr, indices, len(self._vocabularies[k])))
+                sizes.append(np.diff(indptr).astype(np.float64))
+        return EncodedFeatures(self.ids[start:stop], bits, sizes,
+                               np.array(self.positions[start:stop], dtype=np.int64))
+
+    def rows(self, chunk: int) -> Iterator[list[str]]:
+        """Yield the game_columns of every game of the given chunk, as strings.
+
+        Preconditions:
+            - 0 <= chunk < self.num_chunks()
+        """
+        with open(self._path(chunk, 'csv'), newline='') as file:
+            yield from csv.reader(file)
+
+    def save_neighbours(self, chunk: int, indptr: np.ndarray, indices: np.ndarray,
+                        weights: np.ndarray) -> None:
+        """Spill the neighbour lists of the given chunk (see neighbour_chunks)."""
+        np.savez(self._path(chunk, 'neighbours.npz'), indptr=indptr, indices=indices,
+                 weights=weights)
+
+    def load_neighbours(self, chunk: int) -> tuple[np.ndarray, ...]:
+        """Return the neighbour lists of the given chunk spilled by save_neighbours."""
+        with np.load(self._path(chunk, 'neighbours.npz')) as arrays:
+            return (arrays['indptr'], arrays['indices'], arrays['weights'])
+
+    def _path(self, chunk: int, extension: str) -> str:
+        """Return the name of the file storing the given chunk."""
+        return os.path.join(self.directory, f'chunk{chunk}.{extension}')
+
+
+def tidy_game_chunks(input_name: str, chunk_size: int,
+                     positions: Optional[dict[str, int]] = None) -> Iterator[list[Game]]:
+    """Yield the games of the tidy rows of the original csv, in chunks of <chunk_size> games.
+
+    As in read_csv, a game id that is repeated keeps the data of its last row: it is only
+    yielded once its last row is read. The csv is read twice, first to find the last row of
+    every game id. If positions is not None, it is filled with the position of every game id in
+    the output, which is the position of its first row.
+
+    Each chunk has its own FeatureVocabulary, so the feature masks of games in different chunks
+    cannot be compared; the chunks are scored by similarity_engine instead.
+
+    Preconditions:
+        - chunk_size > 0
+    """
+    last_rows = {}
+    for k, row in enumerate(_tidy_rows(input_name)):
+        last_rows[get_id_num(row[0])] = k
+    if positions is not None:
+        positions.update((id_num, position) for position, id_num in enumerate(last_rows))
+
+    chunk, texts, vocabulary = [], ListTextStore(), FeatureVocabulary()
+    for k, row in enumerate(_tidy_rows(input_name)):
+        if last_rows[get_id_num(row[0])] == k:
+            chunk.append(init_game_obj(row, texts, vocabulary))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk, texts, vocabulary = [], ListTextStore(), FeatureVocabulary()
+
+    if chunk != []:
+        yield chunk
+
+
+def _tidy_rows(input_name: str) -> Iterator[list[str]]:
+    """Yield the tidy rows of the original csv."""
+    with open(input_name, errors='ignore') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)
+        for row in reader:
+            if check_tidiness(row):
+                yield row
+
+
+def neighbour_chunks(spilled: SpilledCatalogue) -> Iterator[tuple[np.ndarray, ...]]:
+    """Yield the neighbour lists of the games of each chunk, in chunk order.
+
+    Each neighbour list is a tuple (indptr, indices, weights) of CSR arrays: the neighbours of
+    the i-th game of the chunk are the spilled games indices[indptr[i]:indptr[i + 1]], in the
+    order read_csv lists them in. That is the games spilled before it by position, then the
+    games spilled after it in spill order, which is ascending position if no id is repeated.
+    """
+    positions = np.array(spilled.positions, dtype=np.int64)
+    for row_chunk in range(spilled.num_chunks()):
+        rows = spilled.features(row_chunk)
+        row_ids, column_ids, weights = [], [], []
+        for column_chunk in range(spilled.num_chunks()):
+            scores = score_features(rows, spilled.features(column_chunk))
+            if column_chunk == row_chunk:
+                np.fill_diagonal(scores, 0.0)
+            i_s, js = np.nonzero(scores > 2)
+            row_ids.append(i_s)
+            column_ids.append(js + spilled.chunk_starts[column_chunk])
+            weights.append(scores[i_s, js])
+
+        row_ids, column_ids = np.concatenate(row_ids), np.concatenate(column_ids)
+        later = column_ids > row_ids + spilled.chunk_starts[row_chunk]
+        order = np.lexsort((np.where(later, column_ids, positions[column_ids]), later, row_ids))
+        indptr = np.zeros(len(rows.ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(row_ids, minlength=len(rows.ids)))
+        yield (indptr, column_ids[order], np.concatenate(weights)[order])
+
+
+def bound_neighbours(spilled: SpilledCatalogue, chunks: Iterator[tuple[np.ndarray, ...]],
+                     max_neighbours: int) -> Iterator[tuple[np.ndarray, ...]]:
+    """Yield the neighbour lists of <chunks>, keeping only the edges among the max_neighbours
+    heaviest edges of both of their games, as BoundedGraphBuilder does.
+
+    Whether an edge is kept depends on the neighbours of both of its games, so the neighbour
+    lists are spilled to disk until the cutoff of every game is known. Only the weight and the
+    position of the max_neighbours-th heaviest edge of each game are kept in memory. The kept
+    neighbours are listed by position, as in the graph BoundedGraphBuilder builds.
+
+    Preconditions:
+        - max_neighbours > 0
+    """
+    positions = np.array(spilled.positions, dtype=np.int64)
+    # a neighbour (weight, j) is among the heaviest edges of game i if it is at least
+    # (cutoff_weights[i], -cutoff_positions[i]); ties are broken in favour of the first games
+    cutoff_weights = np.full(len(spilled.ids), -np.inf)
+    cutoff_positions = np.zeros(len(spilled.ids), dtype=np.int64)
+    for chunk, (indptr, indices, weights) in enumerate(chunks):
+        spilled.save_neighbours(chunk, indptr, indices, weights)
+        for i in range(len(indptr) - 1):
+            if indptr[i + 1] - indptr[i] >= max_neighbours:
+                row = slice(indptr[i], indptr[i + 1])
+                cutoff = np.lexsort((positions[indices[row]], -weights[row]))[max_neighbours - 1]
+                cutoff_weights[spilled.chunk_starts[chunk] + i] = weights[row][cutoff]
+                cutoff_positions[spilled.chunk_starts[chunk] + i] = positions[indices[row]][cutoff]
+
+    for chunk in range(spilled.num_chunks()):
+        indptr, indices, weights = spilled.load_neighbours(chunk)
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)) \
+            + spilled.chunk_starts[chunk]
+        keep = _is_heaviest(weights, positions[indices], cutoff_weights[rows],
+                            cutoff_positions[rows]) \
+            & _is_heaviest(weights, positions[rows], cutoff_weights[indices],
+                           cutoff_positions[indices])
+        order = np.lexsort((positions[indices[keep]], rows[keep]))
+        counts = np.bincount(rows[keep] - spilled.chunk_starts[chunk], minlength=len(indptr) - 1)
+        yield (np.concatenate(([0], np.cumsum(counts))), indices[keep][order],
+               weights[keep][order])
+
+
+def _is_heaviest(weights: np.ndarray, positions: np.ndarray, cutoff_weights: np.ndarray,
+                 cutoff_positions: np.ndarray) -> np.ndarray:
+    """Return whether each edge (weight, position of neighbour) is at least the cutoff edge."""
+    return (weights > cutoff_weights) \
+        | ((weights == cutoff_weights) & (positions <= cutoff_positions))
+
+
+def stream_csv(input_name: str, output_name: str, chunk_size: int = CHUNK_SIZE,
+               max_neighbours: Optional[int] = None, spill_directory: Optional[str] = None,
+               write_binary: bool = False) -> None:
+    """Write the same final games csv as read_csv, keeping at most a few chunks of <chunk_size>
+    games in memory.
+
+    The chunks are spilled to a temporary directory inside <spill_directory> (by default, the
+    system temporary directory), which is removed afterwards.
+
+    The binary catalogue is only written if write_binary is True. It is built from the whole
+    output (see write_binary_catalogue), so the memory used is then no longer bounded by the
+    chunk size; without it, load_games reads the csv.
+
+    Preconditions:
+        - chunk_size > 0
+        - max_neighbours is None or max_neighbours > 0
+
+    >>> import csv, os, tempfile
+    >>> from data_computations import read_csv
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     expected, actual = os.path.join(directory, 'a.csv'), os.path.join(directory, 'b.csv')
+    ...     read_csv('data/sample_original_games.csv', expected, max_neighbours=5)
+    ...     stream_csv('data/sample_original_games.csv', actual, 16, max_neighbours=5)
+    ...     open(expected, 'rb').read() == open(actual, 'rb').read()
+    True
+
+    A repeated game id keeps the data of its last row, as in read_csv:
+
+    >>> with open('data/sample_original_games.csv', errors='ignore') as file:
+    ...     rows = list(csv.reader(file))
+    >>> repeated = rows[2][:9] + [rows[9][9]] + rows[2][10:]  # the same game with other tags
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     original = os.path.join(directory, 'original.csv')
+    ...     with open(original, 'w', newline='') as file:
+    ...         csv.writer(file).writerows(rows[:30] + [repeated] + rows[30:60])
+    ...     expected, actual = os.path.join(directory, 'a.csv'), os.path.join(directory, 'b.csv')
+    ...     for max_neighbours in [None, 2]:
+    ...         read_csv(original, expected, max_neighbours=max_neighbours)
+    ...         stream_csv(original, actual, 8, max_neighbours)
+    ...         print(open(expected, 'rb').read() == open(actual, 'rb').read())
+    True
+    True
+    """
+    with tempfile.TemporaryDirectory(dir=spill_directory) as directory:
+        spilled = SpilledCatalogue(directory)
+        positions = {}
+        for games in tidy_game_chunks(input_name, chunk_size, positions):
+            spilled.add_chunk(games, [positions[game.id_num] for game in games])
+        del positions
+
+        chunks = neighbour_chunks(spilled)
+        if max_neighbours is not None:
+            chunks = bound_neighbours(spilled, chunks, max_neighbours)
+
+        with open(output_name, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(FINAL_CSV_HEADER)
+            if spilled.positions == list(range(len(spilled.ids))):
+                for chunk, neighbours in enumerate(chunks):
+                    writer.writerows(_output_rows(spilled, chunk, neighbours))
+            else:
+                # a repeated game is written at the position of its first row, before the chunk
+                # it was spilled in, so the rows are read back from disk in output order
+                for chunk, neighbours in enumerate(chunks):
+                    spilled.save_neighbours(chunk, *neighbours)
+                writer.writerows(_rows_by_position(spilled))
+
+    if write_binary:
+        write_binary_catalogue(output_name)
+
+
+def _output_rows(spilled: SpilledCatalogue, chunk: int,
+                 neighbours: tuple[np.ndarray, ...]) -> Iterator[list[str]]:
+    """Yield the output rows of the games of the given chunk, in spill order, given their
+    neighbour lists."""
+    indptr, indices, weights = neighbours[0], neighbours[1].tolist(), neighbours[2].tolist()
+    for i, columns in enumerate(spilled.rows(chunk)):
+        row = slice(indptr[i], indptr[i + 1])
+        yield columns + neighbour_columns([spilled.ids[j] for j in indices[row]], weights[row])
+
+
+def _rows_by_position(spilled: SpilledCatalogue) -> Iterator[list[str]]:
+    """Yield the output rows of every spilled game in output order, reading the rows and the
+    neighbour lists saved with save_neighbours one chunk at a time."""
+    loaded_chunk, loaded_rows = None, []
+    for i in np.argsort(spilled.positions, kind='stable').tolist():
+        chunk = spilled.chunk_of(i)
+        if chunk != loaded_chunk:
+            loaded_chunk = chunk
+            loaded_rows = list(_output_rows(spilled, chunk, spilled.load_neighbours(chunk)))
+        yield loaded_rows[i - spilled.chunk_starts[chunk]]
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'bisect', 'collections.abc', 'csv', 'os',
+                          'tempfile', 'typing', 'numpy', 'data_computations', 'similarity_engine',
+                          'weighted_decision'],
+        'allowed-io': ['SpilledCatalogue.add_chunk', 'SpilledCatalogue.rows', '_tidy_rows',
+                       'stream_csv'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
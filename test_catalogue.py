@@ -0,0 +1,119 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module tests that load_games reads the csv instead of a binary catalogue that is
+fresh but truncated or corrupt.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+import os
+import struct
+from typing import Callable
+import numpy as np
+import pytest
+import catalogue
+from data_computations import load_games, load_games_csv, read_csv
+
+
+def build(directory: os.PathLike) -> str:
+    """Build the final csv and binary catalogue of the sample csv in <directory>, and return
+    the name of the csv."""
+    filename = os.path.join(directory, 'final_games.csv')
+    read_csv('data/sample_original_games.csv', filename)
+    return filename
+
+
+def corrupt(filename: str, change: Callable[[bytearray], None]) -> None:
+    """Apply <change> to the binary catalogue of the csv <filename>, keeping it fresh."""
+    binary = catalogue.binary_name(filename)
+    with open(binary, 'rb') as file:
+        data = bytearray(file.read())
+    change(data)
+    with open(binary, 'wb') as file:
+        file.write(data)
+    assert catalogue.is_fresh(binary, filename)
+
+
+def section_entry(data: bytearray, name: str) -> int:
+    """Return the offset of the entry of the given section in the section table of <data>."""
+    start, size = struct.calcsize(catalogue.HEADER_FORMAT), \
+        struct.calcsize(catalogue.SECTION_FORMAT)
+    for i in range(struct.unpack_from(catalogue.HEADER_FORMAT, data)[2]):
+        if struct.unpack_from(catalogue.SECTION_FORMAT, data, start + i * size)[0] \
+                .rstrip(b'\0').decode() == name:
+            return start + i * size
+    raise KeyError(name)
+
+
+def set_section_value(data: bytearray, name: str, index: int, value: int) -> None:
+    """Set the item at the given index of the given section of <data> to <value>."""
+    _, dtype, offset, _ = struct.unpack_from(catalogue.SECTION_FORMAT, data,
+                                             section_entry(data, name))
+    array = np.frombuffer(data, dtype=np.dtype(dtype.rstrip(b'\0').decode()))
+    array[offset // array.itemsize + index] = value
+
+
+def truncate_half(data: bytearray) -> None:
+    """Cut the file in half."""
+    del data[len(data) // 2:]
+
+
+def truncate_table(data: bytearray) -> None:
+    """Cut the file in the middle of the section table."""
+    del data[struct.calcsize(catalogue.HEADER_FORMAT) + 10:]
+
+
+def bad_dtype(data: bytearray) -> None:
+    """Replace the dtype of the first section with garbage."""
+    struct.pack_into('<8s', data, section_entry(data, 'id_num_offsets') + 32, b'\xff?')
+
+
+def neighbour_out_of_range(data: bytearray) -> None:
+    """Point the first neighbour at a game that does not exist."""
+    set_section_value(data, 'neighbour_indices', 0, 10 ** 6)
+
+
+def decreasing_offsets(data: bytearray) -> None:
+    """Make the offsets of the names decrease."""
+    set_section_value(data, 'name_offsets', 1, 10 ** 6)
+
+
+def missing_section(data: bytearray) -> None:
+    """Rename the section of the neighbour weights."""
+    struct.pack_into('<32s', data, section_entry(data, 'neighbour_weights'), b'other')
+
+
+@pytest.mark.parametrize('change', [truncate_half, truncate_table, bad_dtype,
+                                    neighbour_out_of_range, decreasing_offsets, missing_section])
+def test_corrupt_catalogue(tmp_path: os.PathLike, change: Callable[[bytearray], None]) -> None:
+    """Test that read_catalogue rejects a corrupt catalogue with a ValueError, and that
+    load_games reads the csv instead."""
+    filename = build(tmp_path)
+    corrupt(filename, change)
+
+    with pytest.raises(ValueError):
+        catalogue.read_catalogue(catalogue.binary_name(filename))
+    games, _, graph = load_games(filename)
+    expected_games, _, expected_graph = load_games_csv(filename)
+    assert list(games) == list(expected_games)
+    for id_num in games:
+        assert dict(graph.get_neighbours(id_num).items()) \
+            == dict(expected_graph.get_neighbours(id_num).items())
+
+
+def test_valid_catalogue(tmp_path: os.PathLike) -> None:
+    """Test that a valid catalogue passes the checks."""
+    filename = build(tmp_path)
+    games, _, _ = catalogue.read_catalogue(catalogue.binary_name(filename))
+    assert list(games) == list(load_games_csv(filename)[0])
+
+
+if __name__ == '__main__':
+    pytest.main(['test_catalogue.py'])
@@ -0,0 +1,294 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module tests library_cache against a stub of the Steam API, an http.server running
+on localhost that returns the responses queued for each Steam ID and records every request.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+from __future__ import annotations
+from collections.abc import Iterator
+import http.server
+import json
+import os
+import threading
+import time
+from typing import Optional
+import urllib.error
+import urllib.parse
+import pytest
+from library_cache import LibraryCache, fetch_library, open_library_cache
+from loading_states import LOADED, FAILED
+
+
+class StubSteamApi(http.server.ThreadingHTTPServer):
+    """A stub of the Steam API on localhost.
+
+    Each response is a tuple (status, body, delay): the server waits <delay> seconds, then
+    answers with the given status and body. The queued responses of a Steam ID are returned in
+    order, and the last one is repeated.
+
+    Instance Attributes:
+        - url: the base url of the stub, to pass to fetch_library
+        - responses: maps each Steam ID to its queued responses
+        - requests: the Steam IDs of the requests received so far, in order
+    """
+    url: str
+    responses: dict[str, list[tuple[int, str, float]]]
+    requests: list[str]
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/'
+        self.responses = {}
+        self.requests = []
+
+    def queue(self, steam_id: str, *responses: tuple[int, str, float]) -> None:
+        """Queue the given responses for the given Steam ID."""
+        self.responses.setdefault(steam_id, []).extend(responses)
+
+    def handle_error(self, request: object, client_address: object) -> None:
+        """Ignore the errors of answering a client that has stopped waiting."""
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """The request handler of StubSteamApi."""
+    server: StubSteamApi
+
+    def do_GET(self) -> None:
+        """Answer with the next response queued for the requested Steam ID."""
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        steam_id = query['steamid'][0].removesuffix('=json')
+        self.server.requests.append(steam_id)
+        responses = self.server.responses.get(steam_id, [(404, '{}', 0.0)])
+        status, body, delay = responses.pop(0) if len(responses) > 1 else responses[0]
+
+        time.sleep(delay)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args: object) -> None:
+        """Do not log the requests."""
+
+
+class FakeClock:
+    """A clock that only moves when it is told to.
+
+    Instance Attributes:
+        - now: the current time, in seconds
+    """
+    now: float
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def library(*app_ids: int) -> str:
+    """Return the body of a Steam API response for a library with the given games."""
+    return json.dumps({'response': {'game_count': len(app_ids),
+                                    'games': [{'appid': app_id} for app_id in app_ids]}})
+
+
+def app_ids(data: dict) -> list[int]:
+    """Return the app ids of the games of the given library."""
+    return [game['appid'] for game in data['response']['games']]
+
+
+@pytest.fixture
+def server() -> Iterator[StubSteamApi]:
+    """Run a StubSteamApi in a background thread for the duration of a test."""
+    stub = StubSteamApi()
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def make_cache(server: StubSteamApi, filename: Optional[str], clock: FakeClock,
+               max_entries: int = 10, timeout: float = 5, retries: int = 0) -> LibraryCache:
+    """Return a cache stored in <filename> fetching from the given server, in which an entry is
+    fresh for 100 seconds and stale for 100 more.
+
+    Failed requests are tried again <retries> times, without waiting in between.
+    """
+    return LibraryCache(filename, ttl=100, stale_ttl=100, max_entries=max_entries,
+                        fetch=lambda steam_id: fetch_library(steam_id, server.url, timeout,
+                                                             retries, backoff=0),
+                        clock=clock)
+
+
+def test_fresh_hit(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that a fresh entry is returned without fetching it again."""
+    clock = FakeClock()
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), clock)
+    server.queue('1', (200, library(10), 0.0))
+
+    assert app_ids(cache.get('1')) == [10]
+    clock.now += 50
+    assert app_ids(cache.get('1')) == [10]
+    assert server.requests == ['1']
+
+
+def test_stale_hit(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that a stale entry is returned at once, and fetched again in the background."""
+    clock = FakeClock()
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), clock)
+    server.queue('1', (200, library(10), 0.0), (200, library(10, 20), 0.0))
+
+    cache.get('1')
+    clock.now += 150
+    assert app_ids(cache.get('1')) == [10]
+    cache.wait(5)
+    assert server.requests == ['1', '1']
+    assert app_ids(cache.get('1')) == [10, 20]
+    assert server.requests == ['1', '1']
+
+
+def test_expiry(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that an entry older than ttl + stale_ttl is fetched again before returning."""
+    clock = FakeClock()
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), clock)
+    server.queue('1', (200, library(10), 0.0), (200, library(10, 20), 0.0))
+
+    cache.get('1')
+    clock.now += 250
+    assert app_ids(cache.get('1')) == [10, 20]
+    assert server.requests == ['1', '1']
+
+
+def test_eviction(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that the least recently used entries are removed down to max_entries."""
+    clock = FakeClock()
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), clock, max_entries=2)
+    for steam_id in ['1', '2', '3']:
+        server.queue(steam_id, (200, library(int(steam_id)), 0.0))
+
+    cache.get('1')
+    clock.now += 1
+    cache.get('2')
+    clock.now += 1
+    cache.get('1')  # '2' is now the least recently used
+    clock.now += 1
+    cache.get('3')
+    assert len(cache) == 2
+
+    cache.get('1')
+    cache.get('3')
+    assert server.requests == ['1', '2', '3']
+    cache.get('2')
+    assert server.requests == ['1', '2', '3', '2']
+    assert len(cache) == 2
+
+
+def test_unopenable_file(tmp_path: os.PathLike) -> None:
+    """Test that a cache file in a missing directory gives a cache that stores nothing instead
+    of an error."""
+    assert open_library_cache(os.path.join(tmp_path, 'missing', 'cache.sqlite3')).filename is None
+
+
+def test_no_file(server: StubSteamApi) -> None:
+    """Test that a cache without a file fetches every library."""
+    cache = make_cache(server, None, FakeClock())
+    server.queue('1', (200, library(10), 0.0))
+
+    assert app_ids(cache.get('1')) == [10]
+    assert app_ids(cache.get('1')) == [10]
+    assert server.requests == ['1', '1']
+    assert len(cache) == 0
+
+
+def test_timeout(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that a response slower than the timeout makes the request fail after the retries,
+    without waiting for the response."""
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), FakeClock(),
+                       timeout=0.2, retries=1)
+    server.queue('1', (200, library(10), 2.0))
+
+    start = time.perf_counter()
+    request = cache.get_in_background('1')
+    assert request.wait(5)
+    assert time.perf_counter() - start < 1.5
+    assert request.state == FAILED
+    assert isinstance(request.error, OSError)
+    assert server.requests == ['1', '1']
+
+
+def test_server_error_then_success(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that a server error is tried again, and that the retry can succeed."""
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), FakeClock(), retries=2)
+    server.queue('1', (500, '{}', 0.0), (200, library(10), 0.0))
+
+    request = cache.get_in_background('1')
+    assert request.wait(5)
+    assert request.state == LOADED
+    assert app_ids(request.data) == [10]
+    assert server.requests == ['1', '1']
+    assert len(cache) == 1
+
+
+def test_repeated_server_error(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that a request failing every retry is FAILED, and is not cached."""
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), FakeClock(), retries=2)
+    server.queue('1', (500, '{}', 0.0))
+
+    request = cache.get_in_background('1')
+    assert request.wait(5)
+    assert request.state == FAILED
+    assert isinstance(request.error, urllib.error.HTTPError) and request.error.code == 500
+    assert server.requests == ['1', '1', '1']
+    assert len(cache) == 0
+
+
+def test_malformed_json(server: StubSteamApi, tmp_path: os.PathLike) -> None:
+    """Test that a response that is not JSON makes the request FAILED."""
+    cache = make_cache(server, os.path.join(tmp_path, 'cache.sqlite3'), FakeClock())
+    server.queue('1', (200, '{"response": ', 0.0))
+
+    request = cache.get_in_background('1')
+    assert request.wait(5)
+    assert request.state == FAILED
+    assert isinstance(request.error, json.JSONDecodeError)
+
+
+def test_other_errors(tmp_path: os.PathLike) -> None:
+    """Test that an error that is not a network error still makes the request FAILED instead of
+    leaving it LOADING, and keeps the stale entry when it happens in a background refresh."""
+    libraries = [{'response': {}}]
+
+    def fetch(steam_id: str) -> dict:
+        """Return the first library once, then raise a KeyError."""
+        if libraries == []:
+            raise KeyError(steam_id)
+        return libraries.pop()
+
+    clock = FakeClock()
+    cache = LibraryCache(os.path.join(tmp_path, 'cache.sqlite3'), ttl=100, stale_ttl=100,
+                         fetch=fetch, clock=clock)
+    cache.get('1')
+    request = cache.get_in_background('2')
+    assert request.wait(5)
+    assert request.state == FAILED
+    assert isinstance(request.error, KeyError)
+
+    clock.now += 150
+    assert cache.get('1') == {'response': {}}
+    cache.wait(5)
+    assert cache.get('1') == {'response': {}}
+
+
+if __name__ == '__main__':
+    pytest.main(['test_library_cache.py'])
@@ -0,0 +1,182 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module checks that the parsers of the original csv fields in data_computations
+give the same results as the split-based parsers they replaced, on every tidy row of the sample
+csv. The old parsers are copied below as they were.
+
+The only intended difference is the review percentage of games with 100% positive reviews,
+which the old get_all_reviews read as 0 (it only read two digits), so their popularity score
+was 0.0.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+import csv
+import pytest
+from data_computations import check_tidiness, get_all_reviews, get_genre_bools, get_id_num, \
+    get_mature_content, parse_row, VIOLENCE_KEYWORDS, ADDICTION_KEYWORDS, HORROR_KEYWORDS, \
+    SEX_KEYWORDS, GENERAL_KEYWORDS
+
+SAMPLE_CSV = 'data/sample_original_games.csv'
+
+
+def old_get_id_num(url: str) -> str:
+    """Find the id number of the game from the given url, as the old parser did."""
+    id_num, digit = '', False
+    for i in range(0, len(url)):
+        if url[i].isdigit():
+            digit = True
+            id_num += url[i]
+        elif url[i] == '/' and digit is True:
+            break
+
+    return id_num
+
+
+def old_get_all_reviews(info: str) -> tuple[int, int]:
+    """Get review information from the given string, as the old parser did."""
+    index = info.index('%')
+    percentage = int(info[index - 2:index])
+    total_players = 0
+    for i in range(index + 9, index + 16):
+        if info[i] == ' ':
+            break
+        elif info[i].isdigit():
+            total_players *= 10
+            total_players += int(info[i])
+
+    return (percentage, total_players)
+
+
+def old_get_mature_content(description: str) -> set[str]:
+    """Return a set of keywords from the given description, as the old parser did."""
+    set_so_far = set()
+    lst = description.split()
+    for i in range(10, len(lst)):
+        word = lst[i].lower().strip('-,;.!\"\'')
+        if word in VIOLENCE_KEYWORDS:
+            set_so_far.add('violence')
+        elif word in ADDICTION_KEYWORDS:
+            set_so_far.add('addiction')
+        elif word in HORROR_KEYWORDS:
+            set_so_far.add('horror')
+        elif word in SEX_KEYWORDS:
+            set_so_far.add('sex')
+        elif word in GENERAL_KEYWORDS:
+            set_so_far.add('general')
+
+    if set_so_far == set():
+        set_so_far.add('other')
+    return set_so_far
+
+
+def old_get_genre_bools(game_details: set[str], genre: set[str]) -> list[bool]:
+    """Return the answers to the genre questions, as the old parser did."""
+    lst_so_far = [False for _ in range(9)]
+    for word in genre:
+        if word == 'Action':
+            lst_so_far[0] = True
+        elif word == 'Adventure':
+            lst_so_far[1] = True
+        elif word == 'Strategy':
+            lst_so_far[2] = True
+        elif word == 'RPG':
+            lst_so_far[3] = True
+        elif word == 'Simulation':
+            lst_so_far[4] = True
+        elif word == 'Casual':
+            lst_so_far[5] = True
+        elif word == 'Indie':
+            lst_so_far[6] = True
+        elif word in {'Racing', 'Sports'}:
+            lst_so_far[7] = True
+
+    if 'Single-player' in game_details:
+        lst_so_far[8] = True
+
+    return lst_so_far
+
+
+def tidy_rows() -> list[list[str]]:
+    """Return the tidy rows of the sample csv."""
+    with open(SAMPLE_CSV, errors='ignore') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)
+        return [row for row in reader if check_tidiness(row)]
+
+
+def is_all_positive(info: str) -> bool:
+    """Return whether the given review information is of a game with 100% positive reviews."""
+    return '100%' in info
+
+
+def test_sample_has_rows() -> None:
+    """Test that the sample csv has tidy rows, including the expected difference."""
+    rows = tidy_rows()
+    assert len(rows) > 0
+    assert any(is_all_positive(row[5]) for row in rows)
+
+
+def test_id_num() -> None:
+    """Test that get_id_num gives the same id as the old parser on every row."""
+    for row in tidy_rows():
+        assert get_id_num(row[0]) == old_get_id_num(row[0])
+
+
+def test_all_reviews() -> None:
+    """Test that get_all_reviews gives the same reviews as the old parser on every row, except
+    for the percentage of games with 100% positive reviews."""
+    for row in tidy_rows():
+        percentage, total = get_all_reviews(row[5])
+        old_percentage, old_total = old_get_all_reviews(row[5])
+        assert total == old_total
+        if is_all_positive(row[5]):
+            assert (percentage, old_percentage) == (100, 0)
+        else:
+            assert percentage == old_percentage
+
+
+def test_popularity_score() -> None:
+    """Test that the popularity score of every row is unchanged, except that games with 100%
+    positive reviews no longer score 0.0."""
+    for row in tidy_rows():
+        score = parse_row(row)[9]
+        old_percentage, old_total = old_get_all_reviews(row[5])
+        if is_all_positive(row[5]):
+            assert old_total * old_percentage / 100 == 0.0
+            assert score == float(old_total)
+        else:
+            assert score == old_total * old_percentage / 100
+
+
+def test_mature_content() -> None:
+    """Test that get_mature_content gives the same keywords as the old parser on every row."""
+    for row in tidy_rows():
+        if row[15] not in {'NaN', ''}:
+            assert get_mature_content(row[15]) == old_get_mature_content(row[15])
+
+
+def test_genre_bools() -> None:
+    """Test that get_genre_bools gives the same answers as the old parser on every row."""
+    for row in tidy_rows():
+        game_details, genre = set(row[10].split(',')), set(row[13].split(','))
+        assert get_genre_bools(game_details, genre) == old_get_genre_bools(game_details, genre)
+
+
+def test_all_positive_example() -> None:
+    """Test the expected difference on a game with 100% positive reviews out of 11, which now
+    scores 11.0 instead of 0.0."""
+    info = 'Positive,(11),- 100% of the 11 user reviews for this game are positive.'
+    assert get_all_reviews(info) == (100, 11)
+    assert old_get_all_reviews(info) == (0, 11)
+
+
+if __name__ == '__main__':
+    pytest.main(['test_parsers.py'])
@@ -0,0 +1,93 @@
+"""
+CSC111 Winter 2021 Project: Video Game Recommendation System
+
+This Python module compares update_catalogue with a full rebuild of the sample catalogue: the
+catalogue is built from the first rows of the sample csv, then updated with the others, and
+compared with the catalogue built from the whole sample csv.
+
+Without max_neighbours, the update is the same as the rebuild. With max_neighbours, the edges
+cut by the first build are not in the final csv, so the update cannot tell which of them a
+rebuild would keep: it keeps every edge the rebuild keeps, with the same weight, but can keep
+more.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111 course department
+at the University of Toronto St. George campus. All forms of distribution of this code,
+whether as given or with any changes, are strictly prohibited. For more information on
+copyright for CSC111 project materials, please consult our Course Syllabus.
+
+This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
+"""
+import csv
+import os
+from typing import Optional
+import pytest
+from data_computations import read_csv, read_final_csv, update_catalogue
+from weighted_decision import WeightedGraph
+
+SAMPLE_CSV = 'data/sample_original_games.csv'
+
+
+def sample_rows() -> list[list[str]]:
+    """Return every row of the sample csv, including its header, read as preprocess.py reads
+    the rows of an update."""
+    with open(SAMPLE_CSV, errors='ignore') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def update_and_rebuild(directory: os.PathLike, split: int, max_neighbours: Optional[int]) \
+        -> tuple[tuple[dict, dict, WeightedGraph], tuple[dict, dict, WeightedGraph]]:
+    """Return the catalogue (see read_final_csv) built from the rows before <split> of the sample
+    csv and updated with the others, and the catalogue built from the whole sample csv."""
+    rows = sample_rows()
+    original = os.path.join(directory, 'original.csv')
+    updated = os.path.join(directory, 'updated.csv')
+    rebuilt = os.path.join(directory, 'rebuilt.csv')
+    with open(original, 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows[:split])
+
+    read_csv(original, updated, max_neighbours=max_neighbours)
+    update_catalogue(updated, rows[split:], max_neighbours=max_neighbours)
+    read_csv(SAMPLE_CSV, rebuilt, max_neighbours=max_neighbours)
+    return (read_final_csv(updated), read_final_csv(rebuilt))
+
+
+@pytest.mark.parametrize('split', [20, 40, 60, 80])
+def test_update_is_rebuild(tmp_path: os.PathLike, split: int) -> None:
+    """Test that an update without max_neighbours gives the same catalogue as a rebuild."""
+    (columns, _, graph), (expected_columns, _, expected_graph) = \
+        update_and_rebuild(tmp_path, split, None)
+
+    assert columns == expected_columns
+    for id_num in expected_columns:
+        assert graph.get_neighbours(id_num) == expected_graph.get_neighbours(id_num)
+
+
+@pytest.mark.parametrize('split', [20, 40, 60, 80])
+@pytest.mark.parametrize('max_neighbours', [1, 3, 5])
+def test_bounded_update_keeps_rebuild_edges(tmp_path: os.PathLike, split: int,
+                                            max_neighbours: int) -> None:
+    """Test that an update with max_neighbours keeps every edge of a rebuild with the same
+    weight, and keeps at most max_neighbours edges per game."""
+    (columns, _, graph), (expected_columns, _, expected_graph) = \
+        update_and_rebuild(tmp_path, split, max_neighbours)
+
+    assert columns == expected_columns
+    for id_num in expected_columns:
+        neighbours = graph.get_neighbours(id_num)
+        assert expected_graph.get_neighbours(id_num).items() <= neighbours.items()
+        assert len(neighbours) <= max_neighbours
+
+
+def test_bounded_update_is_not_rebuild(tmp_path: os.PathLike) -> None:
+    """Test the documented difference: with max_neighbours 3, an update of the sample catalogue
+    keeps edges that a rebuild cuts."""
+    (columns, _, graph), (_, _, expected_graph) = update_and_rebuild(tmp_path, 60, 3)
+
+    assert any(graph.get_neighbours(id_num) != expected_graph.get_neighbours(id_num)
+               for id_num in columns)
+
+
+if __name__ == '__main__':
+    pytest.main(['test_update_catalogue.py'])
@@ -13,8 +13,25 @@ copyright for CSC111 project materials, please consult our Course Syllabus.
 This file is Copyright (c) 2021 Yifan Li, Yixin Guo, Yige Xiong, Richard Soma.
 """
 from __future__ import annotations
-from typing import Optional, Union
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Mapping
+import heapq
+import threading
+from typing import Optional
 from dataclasses import dataclass
+import numpy as np
+
+# Attributes of Game used to compute similarity scores, in the order compute_similarity uses them
+FEATURE_ATTRIBUTES = ('popular_tags', 'game_details', 'genre', 'mature_content')
+
+# Attributes of Game that are only read from their TextStore when they are used
+LAZY_TEXT_FIELDS = ('url', 'game_description')
+
+# Number of texts kept by a CachedTextStore after they are read
+TEXT_CACHE_SIZE = 64
+
+# Number of genre questions, i.e. the length of Game.genre_bools and the depth of DecisionTree
+NUM_QUESTIONS = 9
 
 
 @dataclass
@@ -22,109 +39,336 @@ class Game:
     """
     Game class
     Instance Attributes:
-        - url: url of store page, https://store.steampowered.com/app/477160/Human_Fall_Flat/
         - id_num: id of the game, '477160'
         - name: name of the game
         - popular_tags: {'Funny','Multiplayer','Co-op','Puzzle'}
         - game_details: {'Multi-player','Online Multi-Player','Stats'}
         - genre: genre of the game, {'Adventure','Indie'}
-        - game_description: long description of the game (for results)
         - mature_content: {'violence', 'addiction'}
         - price: price of the game; if free, 0.0
 
         - popularity_score: number of reviewers * proportion of positive reviews
-        - genre_bools: a list of booleans indicating genre; used for decision tree
-        - recommendation_score: a float representing how much we recommend this game
+        - genre_mask: the genre booleans packed by pack_genre_bools; used for decision tree
+        - feature_masks: the bitmasks of popular_tags, game_details, genre and mature_content
+          given by the FeatureVocabulary of the catalogue; used for similarity scores
+        - texts: the store holding the url and the long description of the game (for results)
+        - text_index: the index of this game in texts
+        - popularity_rank: the rank of popularity_score in the catalogue, scaled to (0, 1];
+          set by rank_popularity when the catalogue is loaded
+
+    The feature sets are frozensets, which a FeatureVocabulary can share between games with the
+    same features. The vocabulary also gives each feature an integer id, so that two games are
+    compared with their feature_masks instead of their sets of strings. The url and the
+    description (LAZY_TEXT_FIELDS) are only read from the store when they are used.
     """
-    url: str
+    __slots__ = ('id_num', 'name', 'popular_tags', 'game_details', 'genre', 'mature_content',
+                 'price', 'popularity_score', 'genre_mask', 'feature_masks', 'texts',
+                 'text_index', 'popularity_rank')
     id_num: str
     name: str
-    popular_tags: set[str]
-    game_details: set[str]
-    genre: set[str]
-    game_description: str
-    mature_content: set[str]
+    popular_tags: frozenset[str]
+    game_details: frozenset[str]
+    genre: frozenset[str]
+    mature_content: frozenset[str]
     price: float
 
     popularity_score: float
-    genre_bools: list[bool]
-    recommendation_score: float
+    genre_mask: int
+    feature_masks: tuple[int, ...]
+    texts: TextStore
+    text_index: int
+    popularity_rank: float
+
+    @property
+    def url(self) -> str:
+        """The url of the store page, https://store.steampowered.com/app/477160/Human_Fall_Flat/
+        """
+        return self.texts.get('url', self.text_index)
+
+    @property
+    def game_description(self) -> str:
+        """The long description of the game."""
+        return self.texts.get('game_description', self.text_index)
+
+    @property
+    def genre_bools(self) -> list[bool]:
+        """A list of booleans indicating genre, unpacked from self.genre_mask."""
+        return unpack_genre_bools(self.genre_mask)
+
+
+class TextStore:
+    """An abstract class for the text fields of the games (LAZY_TEXT_FIELDS), such as their urls
+    and descriptions, that are kept out of the Game objects and only read when they are needed.
+    """
+
+    def get(self, field: str, index: int) -> str:
+        """Return the given field of the game at the given index.
+
+        Preconditions:
+            - field in LAZY_TEXT_FIELDS
+            - 0 <= index < the number of games in this store
+        """
+        raise NotImplementedError
+
+
+class ListTextStore(TextStore):
+    """A TextStore keeping its texts in memory, used while the original csv is preprocessed.
+
+    >>> store = ListTextStore()
+    >>> store.add(('https://store.steampowered.com/app/1/', 'A game.'))
+    0
+    >>> store.get('game_description', 0)
+    'A game.'
+    """
+    # Private Instance Attributes:
+    #   - _texts: the fields of each game, in the order of LAZY_TEXT_FIELDS
+    _texts: list[tuple[str, ...]]
+
+    def __init__(self) -> None:
+        """Initialize an empty store."""
+        self._texts = []
+
+    def add(self, texts: tuple[str, ...]) -> int:
+        """Add the fields of a game, in the order of LAZY_TEXT_FIELDS, and return its index."""
+        self._texts.append(texts)
+        return len(self._texts) - 1
+
+    def get(self, field: str, index: int) -> str:
+        """Return the given field of the game at the given index.
+
+        Preconditions:
+            - field in LAZY_TEXT_FIELDS
+            - 0 <= index < len(self._texts)
+        """
+        return self._texts[index][LAZY_TEXT_FIELDS.index(field)]
+
+
+class CachedTextStore(TextStore):
+    """An abstract class for a TextStore reading its texts from a file, which keeps the
+    TEXT_CACHE_SIZE texts read last.
+
+    The results page only shows a few games at a time, so a small cache avoids reading the same
+    texts again while they are displayed.
+
+    The cache is shared by every thread using the catalogue, so it is only changed while its
+    lock is held. The texts themselves are read without the lock.
+    """
+    # Private Instance Attributes:
+    #   - _cache: the texts read last, by (field, index), from least to most recently used
+    #   - _lock: the lock held while _cache is read or changed
+    _cache: OrderedDict[tuple[str, int], str]
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, field: str, index: int) -> str:
+        """Return the given field of the game at the given index.
+
+        Preconditions:
+            - field in LAZY_TEXT_FIELDS
+            - 0 <= index < the number of games in this store
+        """
+        key = (field, index)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        text = self._read(field, index)
+        with self._lock:
+            self._cache[key] = text
+            if len(self._cache) > TEXT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return text
+
+    def _read(self, field: str, index: int) -> str:
+        """Read the given field of the game at the given index from the file."""
+        raise NotImplementedError
+
+
+class FeatureVocabulary:
+    """A vocabulary of feature names used to build the feature sets of the games in a catalogue.
+
+    Each feature name is stored once, and games with the same features share the same
+    frozenset, so a large catalogue does not hold thousands of copies of the same strings and
+    sets.
+
+    Each feature name of each of FEATURE_ATTRIBUTES also gets an integer id, in the order the
+    names are first seen, and a feature set is represented by a bitmask with the bits of their
+    ids set. Bitmasks are only comparable if they were given by the same vocabulary.
+
+    >>> vocabulary = FeatureVocabulary()
+    >>> tags = vocabulary.intern(['Action', 'Indie'])
+    >>> tags is vocabulary.intern(['Indie', 'Action'])
+    True
+    >>> vocabulary.masks((tags, frozenset(['Stats']), frozenset(['Indie']), frozenset()))
+    (3, 1, 1, 0)
+    >>> vocabulary.csr_masks(1, ['Online', 'Stats'], np.array([0, 2, 3]), np.array([0, 1, 1]))
+    [3, 1]
+    """
+    # Private Instance Attributes:
+    #   - _names: maps each feature name to its shared copy
+    #   - _sets: maps each feature set to its shared copy
+    #   - _bits: maps each feature name to the bit of its id (1 << id), for each of
+    #            FEATURE_ATTRIBUTES
+    #   - _masks: maps each feature set to its bitmask, for each of FEATURE_ATTRIBUTES
+    _names: dict[str, str]
+    _sets: dict[frozenset[str], frozenset[str]]
+    _bits: list[dict[str, int]]
+    _masks: list[dict[frozenset[str], int]]
+
+    def __init__(self) -> None:
+        """Initialize an empty vocabulary."""
+        self._names = {}
+        self._sets = {}
+        self._bits = [{} for _ in FEATURE_ATTRIBUTES]
+        self._masks = [{} for _ in FEATURE_ATTRIBUTES]
+
+    def intern(self, features: Iterable[str]) -> frozenset[str]:
+        """Return the shared frozenset of the given feature names."""
+        feature_set = frozenset(self._names.setdefault(name, name) for name in features)
+        return self._sets.setdefault(feature_set, feature_set)
+
+    def masks(self, feature_sets: tuple[frozenset[str], ...]) -> tuple[int, ...]:
+        """Return the bitmasks of the given feature sets, one for each of FEATURE_ATTRIBUTES.
+
+        Preconditions:
+            - len(feature_sets) == len(FEATURE_ATTRIBUTES)
+        """
+        return tuple(map(self._mask, range(len(FEATURE_ATTRIBUTES)), feature_sets))
+
+    def csr_masks(self, i: int, names: list[str], indptr: np.ndarray,
+                  indices: np.ndarray) -> list[int]:
+        """Return the bitmasks of sets of features of FEATURE_ATTRIBUTES[i] stored as a sparse
+        matrix: set j has the features names[k] for k in indices[indptr[j]:indptr[j + 1]].
+
+        This gives the same masks as masks, but builds them with NumPy instead of one feature at
+        a time, which matters when a whole catalogue is loaded.
+        """
+        bits = self._bits[i]
+        ids = np.array([bits.setdefault(name, 1 << len(bits)).bit_length() - 1 for name in names],
+                       dtype=np.int64)
+        n, width = len(indptr) - 1, len(bits) // 8 + 1
+        matrix = np.zeros((n, width * 8), dtype=bool)
+        matrix[np.repeat(np.arange(n), np.diff(indptr)), ids[indices]] = True
+        data = np.packbits(matrix, axis=1, bitorder='little').tobytes()
+        shared = {}
+        return [shared.setdefault(mask, mask)
+                for mask in (int.from_bytes(data[j * width:(j + 1) * width], 'little')
+                             for j in range(n))]
+
+    def _mask(self, i: int, features: frozenset[str]) -> int:
+        """Return the bitmask of the given set of features of FEATURE_ATTRIBUTES[i]."""
+        mask = self._masks[i].get(features)
+        if mask is None:
+            bits = self._bits[i]
+            for name in features:
+                if name not in bits:
+                    bits[name] = 1 << len(bits)
+            mask = sum(map(bits.__getitem__, features))
+            self._masks[i][features] = mask
+        return mask
 
 
 class DecisionTree:
     """A decision tree used to classify games in terms of genre.
 
+    Since every path from the root to a leaf answers the same NUM_QUESTIONS yes/no questions,
+    the tree is stored as an array indexed by the answers packed into a bitmask (see
+    pack_genre_bools): the leaf reached by a path is the set of game ids at that path's mask.
+
     Representation Invariants:
-        - len(self._subtrees) <= 2
+        - len(self._leaves) == 2 ** NUM_QUESTIONS
     """
     # Private Instance Attributes:
-    #   - _root: the item stored at this tree's root
-    #   - _subtrees: the list of subtrees of this tree
-    _root: Union[bool, set[str]]
-    _subtrees: list[DecisionTree]
+    #   - _leaves: maps each bitmask of answers to the set of game ids with those answers,
+    #              or None if no game was inserted along that path
+    _leaves: list[Optional[set[str]]]
 
-    def __init__(self, root: Union[bool, set[str]]) -> None:
-        """Initialize a new DecisionTree."""
-        self._root = root
-        self._subtrees = []
+    def __init__(self) -> None:
+        """Initialize a new, empty DecisionTree."""
+        self._leaves = [None] * 2 ** NUM_QUESTIONS
 
-    def insert_game(self, items: list[bool], final: str, index: int = 0) -> None:
-        """Insert all items from <items> into this tree after and including <index>,
-         without creating duplicates at the same depth.
+    def insert_game(self, items: list[bool], final: str) -> None:
+        """Insert the game id <final> at the end of the path given by <items>.
 
-        The final item will be added to a set of game ids if the entire path already exists.
+        The id will be added to a set of game ids if the entire path already exists.
         Otherwise, create a new set and add <final> to the set.
 
         Preconditions:
-            - 0 <= index <= len(items) == 9
+            - len(items) == NUM_QUESTIONS
         """
-        if index == len(items):
-            if self._subtrees == []:
-                self._subtrees.append(DecisionTree({final}))
-            else:
-                self._subtrees[0]._root.add(final)
-        else:
-            item = items[index]
+        self.insert_mask(pack_genre_bools(items), final)
 
-            next_tree = None
-            for subtree in self._subtrees:
-                if subtree._root == item:
-                    next_tree = subtree
-                    break
+    def insert_mask(self, mask: int, final: str) -> None:
+        """Insert the game id <final> at the end of the path whose answers packed into a bitmask
+        are <mask>.
 
-            if next_tree is None:
-                next_tree = DecisionTree(item)
-                self._subtrees.append(next_tree)
-
-            next_tree.insert_game(items, final, index + 1)
+        Preconditions:
+            - 0 <= mask < 2 ** NUM_QUESTIONS
+        """
+        if self._leaves[mask] is None:
+            self._leaves[mask] = set()
+        self._leaves[mask].add(final)
 
     def find_games_from_answers(self, answers: list[bool]) -> set[str]:
-        """Return a list of game ids based on <answers>."""
-        curr = self
-        for answer in answers:
-            curr = curr._find_subtree(answer)
-            if curr == set():
-                return curr
+        """Return a set of game ids based on <answers>.
+
+        Return an empty set if no game was inserted with these answers.
+
+        Preconditions:
+            - len(answers) == NUM_QUESTIONS
+
+        >>> tree = DecisionTree()
+        >>> tree.insert_game([True] * 9, '1')
+        >>> tree.find_games_from_answers([True] * 9)
+        {'1'}
+        >>> tree.find_games_from_answers([False] * 9)
+        set()
+        """
+        return self.find_games_from_mask(pack_genre_bools(answers))
 
-        return curr._find_subtree()
+    def num_games(self, mask: int) -> int:
+        """Return the number of game ids whose answers packed into a bitmask are <mask>.
 
-    def _find_subtree(self, answer: Optional[bool] = None) -> Union[DecisionTree, set[str]]:
-        """Return the subtree whose root is <answer>.
+        Preconditions:
+            - 0 <= mask < 2 ** NUM_QUESTIONS
+        """
+        leaf = self._leaves[mask]
+        return 0 if leaf is None else len(leaf)
 
-        If <answer> is None, then return the root of the subtree.
+    def find_games_from_mask(self, mask: int) -> set[str]:
+        """Return the set of game ids whose answers packed into a bitmask are <mask>.
 
         Preconditions:
-            - any(subtree._root is answer for subtree in self._subtrees)
-            - If answer is None, then the only subtree is a set of game ids
+            - 0 <= mask < 2 ** NUM_QUESTIONS
         """
-        if answer is None:
-            return self._subtrees[0]._root
-        else:
-            for subtree in self._subtrees:
-                if subtree._root is answer:
-                    return subtree
+        leaf = self._leaves[mask]
+        return set() if leaf is None else leaf
 
-            return set()
+
+def pack_genre_bools(genre_bools: list[bool]) -> int:
+    """Return the genre booleans packed into an int, with the first boolean as the lowest bit.
+
+    >>> pack_genre_bools([True, False, True] + [False] * 6)
+    5
+    """
+    bits = 0
+    for i in range(len(genre_bools)):
+        if genre_bools[i]:
+            bits |= 1 << i
+    return bits
+
+
+def unpack_genre_bools(bits: int, length: int = NUM_QUESTIONS) -> list[bool]:
+    """Return the list of <length> genre booleans packed into <bits> by pack_genre_bools.
+
+    >>> unpack_genre_bools(5)
+    [True, False, True, False, False, False, False, False, False]
+    """
+    return [bits >> i & 1 == 1 for i in range(length)]
 
 
 class _Vertex:
@@ -178,6 +422,26 @@ class WeightedGraph:
         v1, v2 = self._vertices[game1], self._vertices[game2]
         v1.neighbours[v2], v2.neighbours[v1] = weight, weight
 
+    def remove_edge(self, game1: str, game2: str) -> None:
+        """Remove the edge between the two games.
+
+        Preconditions:
+            - game1 in self._Vertices and game2 in self._Vertices
+            - game2 in self.get_neighbours(game1)
+        """
+        v1, v2 = self._vertices[game1], self._vertices[game2]
+        del v1.neighbours[v2], v2.neighbours[v1]
+
+    def remove_vertex(self, game: str) -> None:
+        """Remove the vertex with the given game id and all of its edges from this graph.
+
+        Preconditions:
+            - game in self._Vertices
+        """
+        v1 = self._vertices.pop(game)
+        for v2 in v1.neighbours:
+            del v2.neighbours[v1]
+
     def get_neighbours(self, game: str) -> dict[str, float]:
         """Return a dictionary mapping neighbours to similarity scores.
 
@@ -188,6 +452,315 @@ class WeightedGraph:
         return {v2.game: v1.neighbours[v2] for v2 in v1.neighbours}
 
 
+class BoundedGraphBuilder:
+    """A graph builder with the same add_vertex/add_edge API as WeightedGraph that keeps at most
+    <max_neighbours> edges per vertex.
+
+    Each vertex keeps its heaviest edges in a min-heap bounded to max_neighbours entries, so the
+    memory used while the graph is built does not depend on how many games are similar. An edge
+    is kept in the final graph only if it is among the heaviest edges of both of its endpoints,
+    which keeps the graph symmetric. Ties are broken in favour of the games added first.
+
+    Instance Attributes:
+        - max_neighbours: the largest number of neighbours a vertex may have
+
+    Representation Invariants:
+        - self.max_neighbours > 0
+        - all(len(heap) <= self.max_neighbours for heap in self._heaps.values())
+    """
+    max_neighbours: int
+    # Private Instance Attributes:
+    #   - _positions: maps each game id to the position it was added at
+    #   - _heaps: maps each game id to a min-heap of (weight, -position of neighbour, neighbour)
+    _positions: dict[str, int]
+    _heaps: dict[str, list[tuple[float, int, str]]]
+
+    def __init__(self, max_neighbours: int) -> None:
+        """Initialize an empty builder (no vertices or edges)."""
+        self.max_neighbours = max_neighbours
+        self._positions = {}
+        self._heaps = {}
+
+    def add_vertex(self, game: str) -> None:
+        """Add a vertex with the given game id to this graph, if it is not already there.
+        """
+        if game not in self._positions:
+            self._positions[game] = len(self._positions)
+            self._heaps[game] = []
+
+    def add_edge(self, game1: str, game2: str, weight: float) -> None:
+        """Offer an edge with the given weight between the two games.
+
+        Preconditions:
+            - game1 in self._positions and game2 in self._positions
+            - weight >= 2
+        """
+        self._offer(game1, game2, weight)
+        self._offer(game2, game1, weight)
+
+    def _offer(self, game: str, neighbour: str, weight: float) -> None:
+        """Add neighbour to the heap of game if it is among its max_neighbours heaviest edges.
+        """
+        heap, item = self._heaps[game], (weight, -self._positions[neighbour], neighbour)
+        if len(heap) < self.max_neighbours:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def build(self) -> WeightedGraph:
+        """Return the WeightedGraph of the vertices added so far and the edges kept by both of
+        their endpoints.
+
+        The edges are added in the same order as read_csv adds them, so the neighbours of each
+        game are listed in the order the games were added.
+        """
+        kept = {game: {item[2] for item in self._heaps[game]} for game in self._heaps}
+        edges = []
+        for game in self._heaps:
+            for weight, _, neighbour in self._heaps[game]:
+                if self._positions[neighbour] < self._positions[game] and game in kept[neighbour]:
+                    edges.append((self._positions[game], self._positions[neighbour],
+                                  game, neighbour, weight))
+        edges.sort()
+
+        graph = WeightedGraph()
+        for game in self._positions:
+            graph.add_vertex(game)
+        for _, _, game, neighbour, weight in edges:
+            graph.add_edge(neighbour, game, weight)
+
+        return graph
+
+
+class CSRGraph:
+    """An immutable weighted graph of games stored in compressed sparse row (CSR) form.
+
+    The vertices are numbered from 0 in the order of self.ids, and the neighbours of vertex i
+    are indices[indptr[i]:indptr[i + 1]], sorted in increasing order, with the edge weights at
+    the same positions in weights.
+
+    Use a CSRGraphBuilder to build one with the same add_vertex/add_edge API as WeightedGraph.
+
+    Instance Attributes:
+        - ids: the game id of each vertex
+
+    Representation Invariants:
+        - len(self._indptr) == len(self.ids) + 1
+        - len(self._indices) == len(self._weights) == self._indptr[-1]
+        - the graph is symmetric, with no loops
+    """
+    ids: list[str]
+    # Private Instance Attributes:
+    #   - _positions: maps each game id to its vertex number
+    #   - _indptr: the start of the neighbours of each vertex in _indices and _weights
+    #   - _indices: the vertex numbers of the neighbours of every vertex, row after row
+    #   - _weights: the weight of each edge in _indices
+    _positions: dict[str, int]
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _weights: np.ndarray
+
+    def __init__(self, ids: list[str], indptr: np.ndarray, indices: np.ndarray,
+                 weights: np.ndarray) -> None:
+        """Initialize a graph from its CSR arrays. The arrays are not copied, so they can be
+        views of a memory-mapped file.
+        """
+        self.ids = ids
+        self._positions = {ids[i]: i for i in range(len(ids))}
+        self._indptr = indptr
+        self._indices = indices
+        self._weights = weights
+
+    def get_neighbours(self, game: str) -> _NeighbourView:
+        """Return a read-only mapping from neighbours to similarity scores.
+
+        The mapping is a view of the arrays of this graph; no dictionary is built.
+
+        Preconditions:
+            - game in self.ids
+        """
+        i = self._positions[game]
+        start, stop = int(self._indptr[i]), int(self._indptr[i + 1])
+        return _NeighbourView(self, self._indices[start:stop], self._weights[start:stop])
+
+    def position(self, game: str) -> int:
+        """Return the vertex number of the given game, or -1 if it is not in this graph."""
+        return self._positions.get(game, -1)
+
+
+class _NeighbourView(Mapping):
+    """A read-only mapping from the game ids of the neighbours of a vertex in a CSRGraph to the
+    edge weights, backed by slices of the arrays of the graph.
+    """
+    # Private Instance Attributes:
+    #   - _graph: the graph this view belongs to
+    #   - _indices: the sorted vertex numbers of the neighbours
+    #   - _weights: the weight of each edge in _indices
+    _graph: CSRGraph
+    _indices: np.ndarray
+    _weights: np.ndarray
+
+    def __init__(self, graph: CSRGraph, indices: np.ndarray, weights: np.ndarray) -> None:
+        self._graph = graph
+        self._indices = indices
+        self._weights = weights
+
+    def __getitem__(self, game: str) -> float:
+        i = self._graph.position(game)
+        k = int(np.searchsorted(self._indices, i))
+        if i < 0 or k == len(self._indices) or self._indices[k] != i:
+            raise KeyError(game)
+        return float(self._weights[k])
+
+    def __iter__(self) -> Iterator[str]:
+        ids = self._graph.ids
+        return (ids[i] for i in self._indices.tolist())
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def items(self) -> Iterator[tuple[str, float]]:
+        """Return an iterator of (neighbour, weight) pairs, without looking up each weight."""
+        ids = self._graph.ids
+        return zip((ids[i] for i in self._indices.tolist()), self._weights.tolist())
+
+
+class CSRGraphBuilder:
+    """A mutable graph with the same add_vertex/add_edge API as WeightedGraph, used to build a
+    CSRGraph.
+    """
+    # Private Instance Attributes:
+    #   - _ids: the game id of each vertex, in the order they were added
+    #   - _positions: maps each game id to its vertex number
+    #   - _rows: maps each vertex number to a dictionary mapping neighbours to edge weights
+    _ids: list[str]
+    _positions: dict[str, int]
+    _rows: list[dict[int, float]]
+
+    def __init__(self) -> None:
+        """Initialize an empty builder (no vertices or edges)."""
+        self._ids = []
+        self._positions = {}
+        self._rows = []
+
+    def add_vertex(self, game: str) -> None:
+        """Add a vertex with the given game id to this graph.
+
+        If the game is already in the graph, its vertex keeps its number but loses its edges.
+        """
+        if game in self._positions:
+            i = self._positions[game]
+            for j in self._rows[i]:
+                self._rows[j].pop(i)
+            self._rows[i] = {}
+        else:
+            self._positions[game] = len(self._ids)
+            self._ids.append(game)
+            self._rows.append({})
+
+    def add_edge(self, game1: str, game2: str, weight: float) -> None:
+        """Add an edge with the given weight between the two games.
+
+        Preconditions:
+            - game1 in self._positions and game2 in self._positions
+            - weight >= 2
+        """
+        i, j = self._positions[game1], self._positions[game2]
+        self._rows[i][j], self._rows[j][i] = weight, weight
+
+    def build(self) -> CSRGraph:
+        """Return the CSRGraph with the vertices and edges added so far."""
+        indptr = np.zeros(len(self._ids) + 1, dtype=np.int64)
+        indices = np.empty(sum(len(row) for row in self._rows), dtype=np.int32)
+        weights = np.empty(len(indices), dtype=np.float64)
+        for i in range(len(self._rows)):
+            row = sorted(self._rows[i].items())
+            start = indptr[i]
+            indptr[i + 1] = start + len(row)
+            indices[start:indptr[i + 1]] = [j for j, _ in row]
+            weights[start:indptr[i + 1]] = [weight for _, weight in row]
+
+        return CSRGraph(list(self._ids), indptr, indices, weights)
+
+
+class FeatureIndex:
+    """An inverted index mapping every feature of a game to the ids of the games that have it.
+
+    The features of a game are its popular tags, game details, genres and mature content
+    keywords. Two games can only have a similarity score above 2 if they share some of them,
+    so this index is used to find the candidate neighbours of a game without comparing it
+    against the whole catalogue.
+    """
+    # Private Instance Attributes:
+    #   - _postings: maps (attribute name, feature) to the ids of the games with that feature
+    #   - _features: maps each indexed game id to the keys of _postings it was added to
+    #   - _order: maps each game id to the position it was first indexed at
+    _postings: dict[tuple[str, str], set[str]]
+    _features: dict[str, list[tuple[str, str]]]
+    _order: dict[str, int]
+
+    def __init__(self) -> None:
+        """Initialize an empty index."""
+        self._postings = {}
+        self._features = {}
+        self._order = {}
+
+    def add_game(self, game: Game) -> None:
+        """Index the features of the given game.
+
+        If a game with the same id is already indexed, its old features are replaced but it
+        keeps its original position.
+        """
+        if game.id_num in self._features:
+            self.remove_game(game.id_num)
+
+        keys = [(attr, feature) for attr in FEATURE_ATTRIBUTES
+                for feature in getattr(game, attr)]
+        for key in keys:
+            if key not in self._postings:
+                self._postings[key] = set()
+            self._postings[key].add(game.id_num)
+
+        self._features[game.id_num] = keys
+        self._order.setdefault(game.id_num, len(self._order))
+
+    def remove_game(self, id_num: str) -> None:
+        """Remove the features of the game with the given id from this index.
+
+        The position of the game is kept, so that it can be added back in the same place.
+
+        Preconditions:
+            - id_num in self._features
+        """
+        for key in self._features.pop(id_num):
+            self._postings[key].discard(id_num)
+
+    def shared_features(self, game: Game) -> dict[str, list[int]]:
+        """Return a dictionary mapping the id of every indexed game that shares at least one
+        feature with <game> to the number of features shared in each of FEATURE_ATTRIBUTES.
+
+        <game> itself is never included.
+        """
+        shared = {}
+        for i in range(len(FEATURE_ATTRIBUTES)):
+            for feature in getattr(game, FEATURE_ATTRIBUTES[i]):
+                for id_num in self._postings.get((FEATURE_ATTRIBUTES[i], feature), ()):
+                    if id_num not in shared:
+                        shared[id_num] = [0] * len(FEATURE_ATTRIBUTES)
+                    shared[id_num][i] += 1
+
+        shared.pop(game.id_num, None)
+        return shared
+
+    def position(self, id_num: str) -> int:
+        """Return the position at which the game with the given id was first indexed.
+
+        Preconditions:
+            - id_num in self._order
+        """
+        return self._order[id_num]
+
+
 if __name__ == '__main__':
     import doctest
 
@@ -199,7 +772,8 @@ if __name__ == '__main__':
     python_ta.contracts.DEBUG_CONTRACTS = False
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['python_ta.contracts', 'typing', 'dataclasses'],
+        'extra-imports': ['python_ta.contracts', 'collections', 'collections.abc', 'heapq',
+                          'threading', 'typing', 'dataclasses', 'numpy'],
         'allowed-io': [],
         'max-line-length': 100,
         'disable': ['R0902', 'E1136']